@@ -0,0 +1,88 @@
+"""
+Cold-start guard for the headless CLI.
+
+Spawns fresh interpreters and verifies that neither `import core.cli` nor a
+full `run` code path imports Flet or the ui package. It then measures:
+  - `python -m core --help`: argument parsing only, the cold-start budget
+  - the request path imports: what a real `run` pays before the first
+    network byte (dominated by httpx)
+Exits non-zero when a check fails or a median exceeds its budget.
+
+Usage:
+    python benchmarks/bench_cli_startup.py [--runs N] [--help-budget-ms MS] [--run-budget-ms MS]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets are medians in milliseconds above bare interpreter startup
+# (`python -c pass`). Measured in a Linux container at ~80 ms for --help and
+# ~390 ms for the request path; the defaults leave headroom for slower hosts.
+# For comparison, importing flet plus ui.main_window costs ~500 ms on its own.
+DEFAULT_HELP_BUDGET_MS = 150
+DEFAULT_RUN_BUDGET_MS = 600
+
+REQUEST_PATH = "import core.cli, core.llm_client, core.prompt_processor, core.response_cache"
+
+FORBIDDEN_CHECK = (
+    f"import sys, json; {REQUEST_PATH}; "
+    "print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in ('flet', 'flet_core', 'flet_runtime', 'ui'))))"
+)
+
+
+def time_command(cmd, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure headless CLI cold-start time.")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per measurement")
+    parser.add_argument("--help-budget-ms", type=float, default=DEFAULT_HELP_BUDGET_MS,
+                        help="Budget for `python -m core --help` above interpreter startup")
+    parser.add_argument("--run-budget-ms", type=float, default=DEFAULT_RUN_BUDGET_MS,
+                        help="Budget for importing the full request path above interpreter startup")
+    args = parser.parse_args()
+
+    leaked = json.loads(subprocess.run(
+        [sys.executable, "-c", FORBIDDEN_CHECK], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout)
+    if leaked:
+        print(f"FAIL: GUI modules imported by core.cli: {', '.join(leaked)}")
+        return 1
+
+    cases = [
+        ("interpreter", [sys.executable, "-c", "pass"]),
+        ("python -m core --help", [sys.executable, "-m", "core", "--help"]),
+        ("request path imports", [sys.executable, "-c", REQUEST_PATH]),
+    ]
+    results = {}
+    print(f"{'command':<24} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for name, cmd in cases:
+        samples = time_command(cmd, args.runs)
+        results[name] = statistics.median(samples)
+        print(f"{name:<24} {results[name]:>10.1f} {min(samples):>8.1f} {max(samples):>8.1f}")
+
+    baseline = results["interpreter"]
+    status = 0
+    for name, budget in (("python -m core --help", args.help_budget_ms), ("request path imports", args.run_budget_ms)):
+        overhead = results[name] - baseline
+        verdict = "OK" if overhead <= budget else "FAIL"
+        print(f"{verdict}: {name} costs {overhead:.1f} ms over interpreter startup (budget {budget:.0f} ms)")
+        if overhead > budget:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
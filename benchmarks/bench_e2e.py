@@ -0,0 +1,265 @@
+"""
+End-to-end latency benchmark against the local mock server.
+
+Starts benchmarks/mock_server.py in a separate process (so server work does
+not share the client's event loop) and drives:
+  - LLMClient.stream_request     raw client overhead
+  - PromptProcessor.stream_prompt  template load + request build + stream
+  - PromptProcessor.process_prompt non-streaming MCP path
+  - stream_prompt under increasing concurrency
+Reports TTFT, inter-chunk latency percentiles, throughput and memory, and
+writes everything to a JSON file that can be compared across commits.
+
+Usage:
+    python benchmarks/bench_e2e.py --output bench_e2e.json
+    python benchmarks/bench_e2e.py --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.llm_client import LLMClient, StreamError
+from core.prompt_processor import PromptProcessor
+
+PROMPT = "Write a short product description for a handmade ceramic mug."
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize_ms(values):
+    return {
+        "p50": _ms(percentile(values, 50)),
+        "p90": _ms(percentile(values, 90)),
+        "p99": _ms(percentile(values, 99)),
+        "max": _ms(max(values) if values else None),
+    }
+
+
+def _ms(value):
+    return None if value is None else round(value * 1000, 3)
+
+
+async def timed_stream(agen):
+    started = time.perf_counter()
+    first = None
+    last = started
+    gaps = []
+    chunks = errors = 0
+    async for chunk in agen:
+        now = time.perf_counter()
+        if isinstance(chunk, StreamError):
+            errors += 1
+            continue
+        if first is None:
+            first = now - started
+        else:
+            gaps.append(now - last)
+        last = now
+        chunks += 1
+    return {"ttft": first, "total": last - started, "gaps": gaps, "chunks": chunks, "errors": errors}
+
+
+def stream_report(runs):
+    ttfts = [r["ttft"] for r in runs if r["ttft"] is not None]
+    gaps = [g for r in runs for g in r["gaps"]]
+    return {
+        "runs": len(runs),
+        "errors": sum(r["errors"] for r in runs),
+        "ttft_ms": summarize_ms(ttfts),
+        "inter_chunk_ms": summarize_ms(gaps),
+        "total_ms": summarize_ms([r["total"] for r in runs]),
+    }
+
+
+async def bench_client(client, api_url, runs):
+    messages = [{"role": "system", "content": PROMPT}, {"role": "user", "content": "Begin task."}]
+    results = [await timed_stream(client.stream_request(api_url, "bench-key", messages, "mock-model", 0.7))
+               for _ in range(runs)]
+    return stream_report(results)
+
+
+async def bench_processor_stream(processor, runs):
+    results = [await timed_stream(processor.stream_prompt("enhance", PROMPT, 0.7, "en", "markdown"))
+               for _ in range(runs)]
+    return stream_report(results)
+
+
+async def bench_processor_nonstream(processor, runs):
+    latencies = []
+    errors = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await processor.process_prompt("enhance", PROMPT, 0.7, "en", "markdown")
+        latencies.append(time.perf_counter() - started)
+        if result.get("processed_prompt", "").startswith("Error:"):
+            errors += 1
+    return {"runs": runs, "errors": errors, "latency_ms": summarize_ms(latencies)}
+
+
+async def bench_concurrency(processor, level):
+    tracemalloc.start()
+    started = time.perf_counter()
+    runs = await asyncio.gather(*[
+        timed_stream(processor.stream_prompt("enhance", f"{PROMPT} #{i}", 0.7, "en", "markdown"))
+        for i in range(level)
+    ])
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = stream_report(runs)
+    chunks = sum(r["chunks"] for r in runs)
+    report.update({
+        "concurrency": level,
+        "wall_ms": _ms(elapsed),
+        "requests_per_sec": round(level / elapsed, 3),
+        "chunks_per_sec": round(chunks / elapsed, 3),
+        "peak_traced_kb": round(peak / 1024, 1),
+    })
+    return report
+
+
+def start_server(args):
+    cmd = [sys.executable, os.path.join(ROOT, "benchmarks", "mock_server.py"), "--port", "0",
+           "--ttft-ms", str(args.ttft_ms), "--tokens-per-sec", str(args.tokens_per_sec),
+           "--jitter-ms", str(args.jitter_ms), "--completion-tokens", str(args.completion_tokens),
+           "--error-rate", str(args.error_rate), "--seed", "1"]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().strip()
+    if not line.startswith("READY "):
+        proc.kill()
+        raise RuntimeError(f"Mock server failed to start: {line!r}")
+    return proc, int(line.split()[1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_suite(args, api_url):
+    client = LLMClient(max_connections=max(args.concurrency) * 2)
+    processor = PromptProcessor(client, api_url, "bench-key", "mock-model")
+    try:
+        # Warm the pool and the template cache so the first measured run is not an outlier
+        await client.prewarm(api_url)
+        await timed_stream(processor.stream_prompt("enhance", PROMPT, 0.7, "en", "markdown"))
+
+        results = {
+            "client_stream": await bench_client(client, api_url, args.runs),
+            "processor_stream": await bench_processor_stream(processor, args.runs),
+            "processor_nonstream": await bench_processor_nonstream(processor, args.runs),
+            "concurrency": [await bench_concurrency(processor, level) for level in args.concurrency],
+        }
+    finally:
+        await client.close()
+
+    results["process"] = {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    # Project overhead over the configured server latency
+    configured_ttft = args.ttft_ms
+    for key in ("client_stream", "processor_stream"):
+        p50 = results[key]["ttft_ms"]["p50"]
+        results[key]["ttft_overhead_ms"] = None if p50 is None else round(p50 - configured_ttft, 3)
+    return results
+
+
+def flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, list):
+        for item in value:
+            label = item.get("concurrency", len(out)) if isinstance(item, dict) else len(out)
+            flatten(f"{prefix}[{label}]", item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(old, new):
+    old_flat = flatten("", old["results"], {})
+    new_flat = flatten("", new["results"], {})
+    print(f"\nComparison vs {old['meta'].get('commit')}:")
+    print(f"{'metric':<52} {'old':>12} {'new':>12} {'delta':>9}")
+    for key, new_value in new_flat.items():
+        old_value = old_flat.get(key)
+        if old_value is None or key.endswith(".concurrency"):
+            continue
+        delta = f"{(new_value - old_value) / old_value * 100:+.1f}%" if old_value else "n/a"
+        print(f"{key:<52} {old_value:>12.3f} {new_value:>12.3f} {delta:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark against the mock server.")
+    parser.add_argument("--runs", type=int, default=10, help="Sequential runs per single-request scenario")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default="bench_e2e.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Previous results file to diff against")
+    args = parser.parse_args()
+
+    proc, port = start_server(args)
+    try:
+        api_url = f"http://127.0.0.1:{port}/v1/chat/completions"
+        results = asyncio.run(run_suite(args, api_url))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": {"ttft_ms": args.ttft_ms, "tokens_per_sec": args.tokens_per_sec, "jitter_ms": args.jitter_ms,
+                       "completion_tokens": args.completion_tokens, "error_rate": args.error_rate},
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for key in ("client_stream", "processor_stream"):
+        r = results[key]
+        print(f"{key:<20} ttft p50 {r['ttft_ms']['p50']} ms (overhead {r['ttft_overhead_ms']} ms), "
+              f"inter-chunk p50/p99 {r['inter_chunk_ms']['p50']}/{r['inter_chunk_ms']['p99']} ms")
+    print(f"{'processor_nonstream':<20} latency p50 {results['processor_nonstream']['latency_ms']['p50']} ms")
+    for r in results["concurrency"]:
+        print(f"concurrency {r['concurrency']:<8} {r['requests_per_sec']} req/s, {r['chunks_per_sec']} chunks/s, "
+              f"ttft p99 {r['ttft_ms']['p99']} ms, peak {r['peak_traced_kb']} KB")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
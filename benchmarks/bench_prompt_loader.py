@@ -0,0 +1,75 @@
+"""
+Micro-benchmark for PromptLoader.load_prompt.
+
+Compares the previous read-and-replace implementation against the compiled,
+mtime-invalidated template cache for a range of template and prompt sizes.
+
+Usage:
+    python benchmarks/bench_prompt_loader.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.prompt_loader import PromptLoader
+
+
+def legacy_load_prompt(loader, file_path, original_prompt, language, output_format):
+    # The pre-cache implementation: blocking read plus three full-string replaces
+    with open(file_path, "r", encoding="utf-8") as f:
+        template = f.read()
+    lang_instruction = loader._get_language_instruction(language)
+    format_instruction = loader._get_format_instruction(output_format)
+    filled_prompt = template.replace("{{original_prompt}}", original_prompt)
+    filled_prompt = filled_prompt.replace("{{language_instruction}}", lang_instruction)
+    filled_prompt = filled_prompt.replace("{{format_instruction}}", format_instruction)
+    return filled_prompt
+
+
+def make_template(size_bytes):
+    header = "You are an expert prompt engineer.\n\n1. {{format_instruction}}\n2. {{language_instruction}}\n\n"
+    filler = "Guideline: keep the core intent intact while improving clarity.\n"
+    body = filler * max(1, (size_bytes - len(header)) // len(filler))
+    return header + body + "\n**Original Prompt**:\n{{original_prompt}}\n"
+
+
+def run_case(prompts_dir, template_kb, prompt_kb, repeat):
+    path = os.path.join(prompts_dir, "bench.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(make_template(template_kb * 1024))
+
+    loader = PromptLoader(prompts_dir=prompts_dir)
+    original_prompt = ("Describe a quiet harbor at dawn. " * (prompt_kb * 32))[:prompt_kb * 1024]
+
+    expected = legacy_load_prompt(loader, path, original_prompt, "en", "markdown")
+    assert loader.load_prompt("bench", original_prompt, "en", "markdown") == expected
+
+    legacy = min(timeit.repeat(
+        lambda: legacy_load_prompt(loader, path, original_prompt, "en", "markdown"),
+        number=repeat, repeat=3)) / repeat
+    compiled = min(timeit.repeat(
+        lambda: loader.load_prompt("bench", original_prompt, "en", "markdown"),
+        number=repeat, repeat=3)) / repeat
+    return legacy, compiled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="Calls per measurement")
+    args = parser.parse_args()
+
+    cases = [(4, 1), (4, 1024), (256, 1), (256, 1024), (1024, 10 * 1024)]
+    print(f"{'template':>10} {'prompt':>10} {'legacy us':>12} {'compiled us':>12} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as prompts_dir:
+        for template_kb, prompt_kb in cases:
+            repeat = max(1, args.repeat // max(1, prompt_kb // 1024))
+            legacy, compiled = run_case(prompts_dir, template_kb, prompt_kb, repeat)
+            print(f"{template_kb:>8}KB {prompt_kb:>8}KB {legacy * 1e6:>12.1f} {compiled * 1e6:>12.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+SSE parsing benchmark for LLMClient.stream_request.
+
+Replays OpenAI-style chat-completion streams (synthetic by default, or a raw
+capture via --file) split into network-sized reads, and compares:
+  - legacy: httpx aiter_lines() decoding + json.loads on every `data:` line
+  - framing only: core.sse.SSEDecoder event splitting without any JSON work
+  - decoder (json): SSEDecoder on raw bytes with the stdlib json backend
+  - decoder (orjson): the same with the optional fast backend, if installed
+Reports content chunks/sec and per-chunk overhead in microseconds.
+
+Usage:
+    python benchmarks/bench_sse.py [--chunks N] [--read-size BYTES] [--file capture.sse]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import sse
+from core.sse import SSEDecoder
+
+WORDS = "the quick brown fox jumps over a lazy dog while prompts stream token by token".split()
+
+
+def make_stream(chunks, keepalive_every=50, seed=7):
+    rng = random.Random(seed)
+    parts = [b": connected\n\n"]
+    for i in range(chunks):
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "bench-model",
+            "choices": [{"index": 0, "delta": {"content": rng.choice(WORDS) + " "}, "finish_reason": None}],
+        }
+        parts.append(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+        if keepalive_every and i % keepalive_every == 0:
+            parts.append(b": keep-alive\n\n")
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def split_reads(raw, read_size):
+    return [raw[i:i + read_size] for i in range(0, len(raw), read_size)]
+
+
+def legacy_parse(reads):
+    # The previous implementation: httpx's aiter_lines() decoding pipeline
+    # (incremental text decode + line splitting) and json.loads per data line
+    from httpx._decoders import LineDecoder, TextDecoder
+
+    out = []
+    text_decoder = TextDecoder()
+    line_decoder = LineDecoder()
+    for read in reads:
+        for line in line_decoder.decode(text_decoder.decode(read)):
+            if line.startswith("data: "):
+                line = line[6:]
+                if line.strip() == "[DONE]":
+                    return out
+                try:
+                    chunk = json.loads(line)
+                    delta = chunk["choices"][0]["delta"]
+                    if "content" in delta:
+                        out.append(delta["content"])
+                except json.JSONDecodeError:
+                    continue
+    return out
+
+
+def decoder_parse(reads, loads):
+    out = []
+    decoder = SSEDecoder()
+    for read in reads:
+        for event in decoder.feed(read):
+            if event.raw == b"[DONE]":
+                return out
+            try:
+                content = loads(event.raw)["choices"][0]["delta"].get("content")
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                continue
+            if content:
+                out.append(content)
+    return out
+
+
+def framing_only(reads):
+    out = []
+    decoder = SSEDecoder()
+    for read in reads:
+        out.extend(decoder.feed(read))
+    return out
+
+
+def measure(fn, reads, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(reads)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSE stream parsing.")
+    parser.add_argument("--chunks", type=int, default=20000, help="Content chunks in the synthetic stream")
+    parser.add_argument("--read-size", type=int, default=1024, help="Bytes per simulated network read")
+    parser.add_argument("--file", help="Raw SSE capture to replay instead of the synthetic stream")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            raw = f.read()
+    else:
+        raw = make_stream(args.chunks)
+    reads = split_reads(raw, args.read_size)
+
+    cases = [
+        ("legacy", legacy_parse),
+        ("decoder (json)", lambda r: decoder_parse(r, sse.stdlib_loads)),
+    ]
+    if sse.JSON_BACKEND != "json":
+        cases.append((f"decoder ({sse.JSON_BACKEND})", lambda r: decoder_parse(r, sse.loads)))
+
+    print(f"stream: {len(raw) / 1024:.0f} KB in {len(reads)} reads of {args.read_size} B")
+    print(f"{'parser':<20} {'chunks':>8} {'chunks/sec':>12} {'us/chunk':>10}")
+    elapsed, events = measure(framing_only, reads, args.repeat)
+    print(f"{'framing only':<20} {len(events):>8} {len(events) / elapsed:>12,.0f} {elapsed / max(1, len(events)) * 1e6:>10.2f}")
+
+    reference = None
+    for name, fn in cases:
+        elapsed, out = measure(fn, reads, args.repeat)
+        if reference is None:
+            reference = out
+        elif out != reference:
+            print(f"WARNING: {name} produced different output than legacy")
+        print(f"{name:<20} {len(out):>8} {len(out) / elapsed:>12,.0f} {elapsed / max(1, len(out)) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
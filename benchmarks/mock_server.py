@@ -0,0 +1,177 @@
+"""
+Local stand-in for an OpenAI-compatible chat-completions endpoint.
+
+Serves POST requests on any path, both streaming (SSE, chunked transfer) and
+non-streaming, with configurable time to first token, token rate, jitter and
+error injection. HTTP/1.1 keep-alive is supported so client pooling behaves
+as it would against a real provider. Standard library only.
+
+Usage:
+    python benchmarks/mock_server.py --port 8765 --ttft-ms 200 --tokens-per-sec 50
+    # then point api_url at http://127.0.0.1:8765/v1/chat/completions
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+WORDS = "the quick brown fox jumps over a lazy dog while prompts stream token by token".split()
+
+REASONS = {200: "OK", 404: "Not Found", 400: "Bad Request", 429: "Too Many Requests",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class MockLLMServer:
+    def __init__(self, ttft_ms: float = 100.0, tokens_per_sec: float = 100.0, jitter_ms: float = 0.0,
+                 completion_tokens: int = 100, error_rate: float = 0.0, error_status: int = 503, seed: int = None):
+        self.ttft = ttft_ms / 1000.0
+        self.token_interval = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.jitter = jitter_ms / 1000.0
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _delay(self, base: float) -> float:
+        if self.jitter:
+            base += self.rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, base)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method = lines[0].split(" ", 1)[0]
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                if method != "POST":
+                    await self._send(writer, 404, b"{}")
+                else:
+                    await self._handle_completion(writer, body)
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            return
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, body, content_type="application/json", extra_headers=""):
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n{extra_headers}\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _handle_completion(self, writer, body):
+        self.requests += 1
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            await self._send(writer, 400, b'{"error": {"message": "invalid json"}}')
+            return
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            await asyncio.sleep(self._delay(self.ttft))
+            await self._send(writer, self.error_status, b'{"error": {"message": "injected failure"}}',
+                             extra_headers="Retry-After: 0\r\n")
+            return
+
+        model = payload.get("model", "mock-model")
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in payload.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.completion_tokens,
+                 "total_tokens": prompt_tokens + self.completion_tokens}
+
+        if not payload.get("stream"):
+            await asyncio.sleep(self._delay(self.ttft) + self.token_interval * (self.completion_tokens - 1))
+            content = " ".join(self.rng.choice(WORDS) for _ in range(self.completion_tokens))
+            response = {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            await self._send(writer, 200, json.dumps(response).encode())
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        await asyncio.sleep(self._delay(self.ttft))
+        for i in range(self.completion_tokens):
+            if i:
+                await asyncio.sleep(self._delay(self.token_interval))
+            chunk = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": self.rng.choice(WORDS) + " "}, "finish_reason": None}],
+            }
+            self._write_chunk(writer, b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            await writer.drain()
+        final = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        self._write_chunk(writer, b"data: " + json.dumps(final).encode() + b"\n\ndata: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat-completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    parser.add_argument("--ttft-ms", type=float, default=100.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=100.0, help="Streaming token rate")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on every delay")
+    parser.add_argument("--completion-tokens", type=int, default=100, help="Tokens per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status used for injected failures")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+async def _serve(args):
+    server = MockLLMServer(args.ttft_ms, args.tokens_per_sec, args.jitter_ms, args.completion_tokens,
+                           args.error_rate, args.error_status, args.seed)
+    port = await server.start(args.host, args.port)
+    # Machine-readable first line so parent processes can find the port
+    print(f"READY {port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Offline batch runner.
+
+Reads prompts from a JSONL file, one object per line:
+    {"id": "a1", "prompt": "...", "mode": "repair", "temperature": 0.3}
+    {"id": "a2", "prompt": "...", "template": "path/to/custom.md"}
+
+and writes one JSON result per line to the output file as each request
+finishes. Usage:
+    python -m core.batch_runner input.jsonl output.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from .config_manager import ConfigManager
+
+
+def iter_jsonl(path):
+    """
+    Lazily yields one dict per non-empty line. Malformed lines become error
+    records so a single bad line does not abort the whole run.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"error": {"code": -32700, "message": f"Parse error on line {line_no}: {e}"}}
+
+
+async def run_batch(processor, input_path, output_path, concurrency=4, language="en", output_format="markdown"):
+    """
+    Streams results to `output_path` as they complete. Returns (succeeded, failed).
+    """
+    succeeded = failed = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        async for result in processor.process_batch(
+            iter_jsonl(input_path), concurrency=concurrency,
+            language=language, output_format=output_format
+        ):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if "error" in result:
+                failed += 1
+            else:
+                succeeded += 1
+    return succeeded, failed
+
+
+def build_parser(parser=None):
+    parser = parser or argparse.ArgumentParser(
+        prog="python -m core.batch_runner",
+        description="Process a JSONL file of prompts with bounded concurrency."
+    )
+    parser.add_argument("input", help="Input JSONL file")
+    parser.add_argument("output", help="Output JSONL file (results are written as they complete)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Maximum requests in flight (default: 4)")
+    parser.add_argument("--config", default="config.json", help="Path to config.json")
+    parser.add_argument("--language", default=None, help="Default response language (overrides config)")
+    parser.add_argument("--format", dest="output_format", default=None, choices=["markdown", "plain"],
+                        help="Default output format (overrides config)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    return parser
+
+
+async def main_async(args):
+    # Deferred so argument parsing and --help stay fast (httpx dominates import time)
+    from .prompt_processor import PromptProcessor
+
+    config_manager = ConfigManager(args.config)
+    if not config_manager.get_endpoints() and (not config_manager.get_api_url() or not config_manager.get_api_key()):
+        print("Error: Please configure api_url and api_key (or endpoints) in the config file.", file=sys.stderr)
+        return 2
+
+    processor = PromptProcessor.from_config(config_manager, use_cache=not args.no_cache)
+
+    started = time.perf_counter()
+    try:
+        succeeded, failed = await run_batch(
+            processor, args.input, args.output, args.concurrency,
+            args.language or config_manager.get_response_language(),
+            args.output_format or config_manager.get_output_format()
+        )
+    finally:
+        await processor.aclose()
+
+    elapsed = time.perf_counter() - started
+    print(f"Done: {succeeded} succeeded, {failed} failed in {elapsed:.1f}s", file=sys.stderr)
+    for stats in processor.llm_client.routing_stats():
+        print(f"  {stats['name']}: {stats['requests']} requests, {stats['failures']} failed, "
+              f"latency {stats['latency_ms']} ms, TTFT {stats['ttft_ms']} ms", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import re
+
+from .tokenizer import get_tokenizer
+
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+
+
+def _split_sections(text: str) -> list:
+    """
+    Splits Markdown into sections that each start at a heading. Headings
+    inside fenced code blocks are ignored so code is never cut apart.
+    """
+    sections = []
+    current = []
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        elif not in_fence and line.startswith("#") and line.lstrip("#")[:1] in (" ", "\t") and current:
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("".join(current))
+    return sections
+
+
+def _split_paragraphs(text: str) -> list:
+    parts = re.split(r"(\n[ \t]*\n)", text)
+    # Keep each blank-line separator attached to the paragraph before it
+    return ["".join(parts[i:i + 2]) for i in range(0, len(parts), 2) if "".join(parts[i:i + 2])]
+
+
+def _split_lines(text: str) -> list:
+    return text.splitlines(keepends=True)
+
+
+def _hard_split(text: str, max_tokens: int, tokenizer) -> list:
+    pieces = []
+    while text:
+        piece = tokenizer.truncate(text, max_tokens) or text[:1]
+        pieces.append(piece)
+        text = text[len(piece):]
+    return pieces
+
+
+def split_structural(text: str, max_tokens: int, model: str = None) -> list:
+    """
+    Splits `text` into chunks of at most `max_tokens` tokens, cutting at the
+    coarsest structural boundary that fits: Markdown headings, then blank-line
+    paragraphs, then lines, and only as a last resort mid-line. Adjacent pieces
+    are packed greedily, so chunks stay as large as the budget allows. Joining
+    the chunks reproduces the input exactly.
+    """
+    if not text:
+        return []
+    tokenizer = get_tokenizer(model)
+    if max_tokens <= 0 or tokenizer.count(text) <= max_tokens:
+        return [text]
+
+    splitters = (_split_sections, _split_paragraphs, _split_lines)
+
+    def pieces(block, level):
+        if tokenizer.count(block) <= max_tokens:
+            return [block]
+        if level == len(splitters):
+            return _hard_split(block, max_tokens, tokenizer)
+        parts = splitters[level](block)
+        if len(parts) <= 1:
+            return pieces(block, level + 1)
+        out = []
+        for part in parts:
+            out.extend(pieces(part, level + 1))
+        return out
+
+    chunks = []
+    current = ""
+    current_tokens = 0
+    for piece in pieces(text, 0):
+        piece_tokens = tokenizer.count(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            chunks.append(current)
+            current, current_tokens = "", 0
+        current += piece
+        current_tokens += piece_tokens
+    if current:
+        chunks.append(current)
+    return chunks
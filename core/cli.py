@@ -0,0 +1,184 @@
+"""
+Headless command-line interface. Never imports Flet or the ui package.
+
+Usage:
+    python -m core run "a cat on the roof" --mode enhance
+    echo "draft prompt" | python -m core run --mode repair --json
+    python -m core run --mode repair --chunked < long_system_prompt.md
+    python -m core batch input.jsonl output.jsonl --concurrency 8
+    python -m core mcp --config config.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import asdict
+
+from .config_manager import ConfigManager
+from . import batch_runner
+
+MODES = ["enhance", "generalize", "repair", "pruning", "custom"]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m core", description="Ning_Prompt headless CLI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Process a single prompt")
+    run.add_argument("prompt", nargs="?", help="Original prompt (read from stdin when omitted)")
+    run.add_argument("-m", "--mode", default="enhance", choices=MODES, help="Processing mode (default: enhance)")
+    run.add_argument("-t", "--template", default=None, help="Custom template path (implies --mode custom)")
+    run.add_argument("--temperature", type=float, default=0.7, help="Sampling temperature (default: 0.7)")
+    run.add_argument("--language", default=None, help="Response language (overrides config)")
+    run.add_argument("--format", dest="output_format", default=None, choices=["markdown", "plain"],
+                     help="Output format (overrides config)")
+    run.add_argument("--json", action="store_true", help="Print a single JSON object instead of streaming text")
+    run.add_argument("--config", default="config.json", help="Path to config.json")
+    run.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    run.add_argument("-o", "--output", default=None,
+                     help="Also stream the generated text to this file as it arrives")
+    run.add_argument("--fsync", default=None, choices=["never", "interval", "always"],
+                     help="When to fsync --output (overrides config; default: interval)")
+    run.add_argument("--chunked", action="store_true",
+                     help="Split long prompts on headings/paragraphs and process the chunks concurrently")
+    run.add_argument("--chunk-tokens", type=int, default=None, help="Max tokens per chunk (overrides config)")
+    run.add_argument("--reduce-template", default=None,
+                     help="Template that merges the chunk outputs (overrides config; default: concatenate)")
+
+    batch = subparsers.add_parser("batch", help="Process a JSONL file of prompts")
+    batch_runner.build_parser(batch)
+
+    mcp = subparsers.add_parser("mcp", help="Serve the prompt modes as an MCP tool over stdio")
+    _mcp_server().build_parser(mcp)
+    return parser
+
+
+def _mcp_server():
+    from .mcp import server
+    return server
+
+
+def _build_processor(config_manager, no_cache=False):
+    # Deferred so argument parsing and --help stay fast (httpx dominates import time)
+    from .prompt_processor import PromptProcessor
+
+    return PromptProcessor.from_config(config_manager, use_cache=not no_cache)
+
+
+async def _run(args):
+    from .llm_client import StreamError
+    from .prompt_processor import TemplateError
+
+    prompt = args.prompt if args.prompt is not None else sys.stdin.read()
+    if not prompt.strip():
+        print("Error: Empty prompt.", file=sys.stderr)
+        return 2
+
+    config_manager = ConfigManager(args.config)
+    if not config_manager.get_endpoints() and (not config_manager.get_api_url() or not config_manager.get_api_key()):
+        print("Error: Please configure api_url and api_key (or endpoints) in the config file.", file=sys.stderr)
+        return 2
+
+    mode = "custom" if args.template else args.mode
+    language = args.language or config_manager.get_response_language()
+    output_format = args.output_format or config_manager.get_output_format()
+    processor = _build_processor(config_manager, args.no_cache)
+
+    try:
+        try:
+            await processor.check_template(mode, args.template)
+        except TemplateError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+
+        if args.chunked:
+            return await _run_chunked(args, processor, config_manager, mode, prompt, language, output_format)
+
+        if args.json:
+            request = processor.build_request(mode, prompt, args.temperature, language, output_format, args.template)
+            response = await processor.execute_mcp_request(request)
+            print(json.dumps(asdict(response), ensure_ascii=False, indent=2))
+            return 1 if response.error else 0
+
+        failed = False
+        sink = _open_sink(args, config_manager)
+        try:
+            async for chunk in processor.stream_prompt(mode, prompt, args.temperature, language, output_format,
+                                                       args.template, sink=sink):
+                if isinstance(chunk, StreamError):
+                    failed = True
+                    sys.stderr.write(chunk)
+                    continue
+                sys.stdout.write(chunk)
+                sys.stdout.flush()
+        finally:
+            if sink:
+                sink.close()
+        sys.stdout.write("\n")
+        return 1 if failed else 0
+    finally:
+        await processor.aclose()
+
+
+def _open_sink(args, config_manager):
+    if not args.output:
+        return None
+    from .output_sink import OutputSink
+
+    sink = OutputSink.from_config(config_manager, args.output)
+    if args.fsync:
+        sink.fsync = args.fsync
+    return sink
+
+
+async def _run_chunked(args, processor, config_manager, mode, prompt, language, output_format):
+    from .llm_client import StreamError
+    from .prompt_processor import TemplateError
+
+    max_tokens = args.chunk_tokens or config_manager.get_chunk_max_tokens()
+    reduce_template = args.reduce_template or config_manager.get_chunk_reduce_template() or None
+    if reduce_template:
+        try:
+            await processor.check_template("custom", reduce_template)
+        except TemplateError as e:
+            print(f"Error: reduce template: {e}", file=sys.stderr)
+            return 2
+    options = (args.template, max_tokens, config_manager.get_chunk_concurrency(), reduce_template)
+
+    if args.json:
+        result = await processor.process_chunked(mode, prompt, args.temperature, language, output_format, *options)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0 if "meta" in result else 1
+
+    # Chunks finish out of order, so report progress on stderr and print the result once complete
+    total = len(processor.split_prompt(prompt, max_tokens))
+    outputs = [[] for _ in range(total)]
+    merged = []
+    done = 0
+    failed = False
+    async for index, chunk in processor.stream_chunked(mode, prompt, args.temperature, language, output_format, *options):
+        if isinstance(chunk, StreamError):
+            failed = True
+            sys.stderr.write(chunk)
+        elif index == "reduce":
+            if chunk is not None:
+                merged.append(chunk)
+        elif chunk is None:
+            done += 1
+            sys.stderr.write(f"\rchunks: {done}/{total}")
+            sys.stderr.flush()
+        else:
+            outputs[index].append(chunk)
+    sys.stderr.write("\n")
+    sys.stdout.write("".join(merged) if reduce_template else processor.join_chunk_outputs(outputs))
+    sys.stdout.write("\n")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "batch":
+        return asyncio.run(batch_runner.main_async(args))
+    if args.command == "mcp":
+        return asyncio.run(_mcp_server().main_async(args))
+    return asyncio.run(_run(args))
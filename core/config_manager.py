@@ -1,10 +1,26 @@
 import json
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 
 class ConfigManager:
-    def __init__(self, config_file="config.json"):
+    def __init__(self, config_file="config.json", flush_delay=0.0):
+        """
+        flush_delay > 0 debounces writes: changes are applied in memory at once
+        and written to disk on a background timer after that many seconds of quiet.
+        """
         self.config_file = config_file
+        self.flush_delay = flush_delay
         self.config = self._load_config()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._batch_depth = 0
+        self._batch_snapshot = None
+        self._pending = {}
+        self._dirty = False
+        self._timer = None
+        self._listeners = []
 
     def _load_config(self):
         if os.path.exists(self.config_file):
@@ -13,57 +29,311 @@ class ConfigManager:
         return {"api_url": "", "api_key": "", "language": "en", "theme_mode": "dark"}
 
     def _save_config(self):
-        with open(self.config_file, 'w') as f:
-            json.dump(self.config, f, indent=4)
+        """
+        Writes the whole config atomically: a temp file in the same directory
+        is fully written and synced, then renamed over the old file, so a crash
+        leaves either the old or the new config, never a truncated one.
+        """
+        # Serialize writers so a later snapshot always lands last
+        with self._write_lock:
+            with self._lock:
+                data = json.dumps(self.config, indent=4)
+                self._dirty = False
+            directory = os.path.dirname(os.path.abspath(self.config_file))
+            fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_file)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    # --- Batched Updates & Change Notifications ---
+    @contextmanager
+    def batch(self):
+        """
+        Groups several changes into one write and one notification:
+
+            with config_manager.batch():
+                config_manager.set_api_url(url)
+                config_manager.set_model(model)
+
+        If the block raises, its changes are rolled back and nothing is written.
+        """
+        with self._lock:
+            if self._batch_depth == 0:
+                self._batch_snapshot = dict(self.config)
+            self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.config = self._batch_snapshot
+                    self._batch_snapshot = None
+                    self._pending = {}
+            raise
+        with self._lock:
+            self._batch_depth -= 1
+            if self._batch_depth:
+                return
+            self._batch_snapshot = None
+        self._commit()
+
+    def update(self, **values):
+        """
+        Sets several config keys at once, e.g. update(api_url=..., model=...), with a single write.
+        """
+        with self.batch():
+            for key, value in values.items():
+                self._set(key, value)
+
+    def subscribe(self, callback, keys=None):
+        """
+        Calls callback(changes) with a {key: new_value} dict after every committed
+        change, optionally only when one of `keys` changed. Returns an unsubscribe function.
+        """
+        entry = (callback, frozenset(keys) if keys is not None else None)
+        self._listeners.append(entry)
+        return lambda: self._listeners.remove(entry) if entry in self._listeners else None
+
+    def flush(self):
+        """
+        Writes pending debounced changes now.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            dirty = self._dirty
+        if dirty:
+            self._save_config()
+
+    def _set(self, key, value):
+        with self._lock:
+            if key in self.config and self.config[key] == value:
+                return
+            self.config[key] = value
+            self._pending[key] = value
+            if self._batch_depth:
+                return
+        self._commit()
+
+    def _commit(self):
+        with self._lock:
+            changes, self._pending = self._pending, {}
+            if not changes:
+                return
+            self._dirty = True
+            if self.flush_delay > 0:
+                # Debounce: restart the timer so a burst of changes is written once
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.start()
+        if self.flush_delay <= 0:
+            self._save_config()
+
+        for callback, keys in list(self._listeners):
+            if keys is None or not keys.isdisjoint(changes):
+                callback(changes)
 
     def get_api_url(self):
         return self.config.get("api_url", "")
 
     def set_api_url(self, url):
-        self.config["api_url"] = url
-        self._save_config()
+        self._set("api_url", url)
 
     def get_api_key(self):
         return self.config.get("api_key", "")
 
     def set_api_key(self, key):
-        self.config["api_key"] = key
-        self._save_config()
+        self._set("api_key", key)
 
     def get_model(self):
         return self.config.get("model", "gpt-3.5-turbo")
 
     def set_model(self, model):
-        self.config["model"] = model
-        self._save_config()
+        self._set("model", model)
+
+    def get_endpoints(self):
+        # [{"url", "key", "model", "weight", "name"}, ...]; empty means use api_url/api_key/model.
+        # Missing keys and models fall back to api_key and model.
+        return self.config.get("endpoints", [])
 
     def get_response_language(self):
         return self.config.get("response_language", "origin")
 
     def set_response_language(self, lang):
-        self.config["response_language"] = lang
-        self._save_config()
+        self._set("response_language", lang)
 
     def get_output_format(self):
         return self.config.get("output_format", "markdown")
 
     def set_output_format(self, fmt):
-        self.config["output_format"] = fmt
-        self._save_config()
+        self._set("output_format", fmt)
 
     def get_language(self):
         return self.config.get("language", "en")
 
     def set_language(self, lang):
-        self.config["language"] = lang
-        self._save_config()
+        self._set("language", lang)
 
     def get_theme_mode(self):
         return self.config.get("theme_mode", "dark")
 
     def set_theme_mode(self, mode):
-        self.config["theme_mode"] = mode
-        self._save_config()
+        self._set("theme_mode", mode)
+
+    def get_render_fps(self):
+        # Maximum output refresh rate while streaming
+        return self.config.get("render_fps", 30)
+
+    # --- HTTP Connection Pool ---
+    def get_http_timeout(self):
+        return self.config.get("http_timeout", 60.0)
+
+    def get_http_max_connections(self):
+        return self.config.get("http_max_connections", 100)
+
+    def get_http_max_keepalive_connections(self):
+        return self.config.get("http_max_keepalive_connections", 20)
+
+    def get_http_keepalive_expiry(self):
+        # Seconds an idle pooled connection is kept open
+        return self.config.get("http_keepalive_expiry", 30.0)
+
+    def get_http2_enabled(self):
+        return self.config.get("http2", False)
+
+    def get_prewarm_enabled(self):
+        return self.config.get("prewarm_connections", True)
+
+    # --- Retry & Circuit Breaker ---
+    def get_retry_max_attempts(self):
+        # Total attempts per request, including the first one
+        return self.config.get("retry_max_attempts", 3)
+
+    def get_retry_base_delay(self):
+        return self.config.get("retry_base_delay", 0.5)
+
+    def get_retry_max_delay(self):
+        return self.config.get("retry_max_delay", 20.0)
+
+    def get_breaker_failure_threshold(self):
+        # Consecutive failures before an endpoint's circuit opens; 0 disables
+        return self.config.get("breaker_failure_threshold", 5)
+
+    def get_breaker_reset_timeout(self):
+        return self.config.get("breaker_reset_timeout", 30.0)
+
+    # --- Rate Limits (0 = unlimited) ---
+    def get_rate_limit_rpm(self):
+        return self.config.get("rate_limit_rpm", 0)
+
+    def get_rate_limit_tpm(self):
+        return self.config.get("rate_limit_tpm", 0)
+
+    # --- Token Budgets ---
+    def get_token_budgets(self):
+        # {"model or prefix or default": max_prompt_tokens | {"max_tokens": n, "action": ...}}
+        return self.config.get("token_budgets", {})
+
+    def get_token_budget_action(self):
+        # warn | truncate | refuse
+        return self.config.get("token_budget_action", "warn")
+
+    # --- Chunked (map-reduce) Processing ---
+    def get_chunk_max_tokens(self):
+        # Prompts longer than this are split when chunked mode is on
+        return self.config.get("chunk_max_tokens", 1500)
+
+    def get_chunk_concurrency(self):
+        return self.config.get("chunk_concurrency", 4)
+
+    def get_chunk_reduce_template(self):
+        # Optional template that merges the chunk outputs; empty = plain concatenation
+        return self.config.get("chunk_reduce_template", "")
+
+    # --- MCP Server ---
+    def get_mcp_max_concurrency(self):
+        # Requests `python -m core mcp` processes at once; the rest queue
+        return self.config.get("mcp_max_concurrency", 8)
+
+    def get_mcp_batch_order(self):
+        # Order of responses in a batch reply: submission or completion
+        return self.config.get("mcp_batch_order", "submission")
+
+    # --- Generation History ---
+    def get_history_enabled(self):
+        return self.config.get("history_enabled", True)
+
+    def get_history_db(self):
+        return self.config.get("history_db", os.path.join(".ning_cache", "history.db"))
+
+    def get_history_page_size(self):
+        return self.config.get("history_page_size", 50)
+
+    # --- Output Spooling ---
+    def get_output_spool_enabled(self):
+        return self.config.get("output_spool_enabled", True)
+
+    def get_output_spool_dir(self):
+        return self.config.get("output_spool_dir", os.path.join(".ning_cache", "outputs"))
+
+    def get_output_spool_keep(self):
+        return self.config.get("output_spool_keep", 20)
+
+    def get_output_fsync(self):
+        # never | interval | always
+        return self.config.get("output_fsync", "interval")
+
+    def get_output_fsync_interval(self):
+        return self.config.get("output_fsync_interval", 1.0)
+
+    def get_output_record_max_chars(self):
+        # Longer spooled outputs are not read back into the cache or history
+        return self.config.get("output_record_max_chars", 1_000_000)
+
+    def get_output_window_pages(self):
+        # Pages (~16 KB each) of a spooled output kept on screen
+        return self.config.get("output_window_pages", 3)
+
+    # --- Metrics ---
+    def get_metrics_enabled(self):
+        return self.config.get("metrics_enabled", False)
+
+    def get_metrics_file(self):
+        # *.json for JSON, anything else for Prometheus text format; empty disables export
+        return self.config.get("metrics_file", "")
+
+    def get_metrics_export_interval(self):
+        return self.config.get("metrics_export_interval", 15.0)
+
+    # --- Response Cache ---
+    def get_cache_enabled(self):
+        return self.config.get("cache_enabled", True)
+
+    def set_cache_enabled(self, enabled):
+        self._set("cache_enabled", enabled)
+
+    def get_cache_dir(self):
+        return self.config.get("cache_dir", os.path.join(".ning_cache", "responses"))
+
+    def get_cache_max_entries(self):
+        return self.config.get("cache_max_entries", 256)
+
+    def get_cache_max_bytes(self):
+        return self.config.get("cache_max_bytes", 50 * 1024 * 1024)
+
+    def get_cache_max_age(self):
+        # Seconds; 0 disables age-based eviction
+        return self.config.get("cache_max_age", 7 * 24 * 3600)
 
 # Example usage (for testing)
 if __name__ == "__main__":
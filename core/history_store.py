@@ -0,0 +1,279 @@
+import asyncio
+import atexit
+import itertools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    mode TEXT,
+    template TEXT,
+    model TEXT,
+    temperature REAL,
+    latency_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    original TEXT NOT NULL,
+    processed TEXT NOT NULL
+);
+"""
+
+# Trigram tokens match any substring of 3+ characters, so search works inside
+# runs of CJK text that a word tokenizer would index as a single token
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5(
+    original, processed, content='generations', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS generations_ai AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts(rowid, original, processed) VALUES (new.id, new.original, new.processed);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_ad AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts(generations_fts, rowid, original, processed)
+    VALUES ('delete', old.id, old.original, old.processed);
+END;
+"""
+FTS_DROP = """
+DROP TRIGGER IF EXISTS generations_ai;
+DROP TRIGGER IF EXISTS generations_ad;
+DROP TABLE IF EXISTS generations_fts;
+"""
+# Shorter search terms cannot use the trigram index
+TRIGRAM_CHARS = 3
+
+COLUMNS = ("created", "mode", "template", "model", "temperature", "latency_ms",
+           "prompt_tokens", "completion_tokens", "original", "processed")
+
+# List rows carry a preview only; full texts are loaded on demand with get()
+PREVIEW_CHARS = 200
+SUMMARY_SELECT = ("SELECT id, created, mode, template, model, temperature, latency_ms, prompt_tokens, "
+                  f"completion_tokens, substr(original, 1, {PREVIEW_CHARS}) AS original, "
+                  f"substr(processed, 1, {PREVIEW_CHARS}) AS processed FROM generations")
+
+_STOP = object()
+
+
+class _Delete:
+    __slots__ = ("entry_id",)
+
+    def __init__(self, entry_id: int):
+        self.entry_id = entry_id
+
+
+def _fts_query(terms: List[str]) -> str:
+    """
+    Turns search terms into a safe FTS5 query: every term must occur as a
+    substring, which also narrows results while the user is still typing.
+    """
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _like_pattern(term: str) -> str:
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class HistoryStore:
+    """
+    Local SQLite history of generations with an FTS5 index over the original
+    and processed prompts. Writes are queued to one background thread and
+    committed in batches, so recording never blocks the caller; reads use
+    their own connection (WAL mode) and keyset pagination, so paging and
+    searching stay fast however large the table grows.
+    """
+    def __init__(self, db_path: str, batch_size: int = 64):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._reader = None
+        self._writer = None
+        self.fts = True
+        self.available = True
+
+        try:
+            directory = os.path.dirname(os.path.abspath(db_path))
+            os.makedirs(directory, exist_ok=True)
+            conn = self._connect()
+            try:
+                self._init_schema(conn)
+            finally:
+                conn.close()
+            self._reader = self._connect(check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Generation history disabled: {e}")
+            self.available = False
+            return
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        # The writer is a daemon thread; commit whatever is still queued when the process exits
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, config_manager):
+        """
+        Builds a store from ConfigManager settings, or returns None when history is disabled.
+        """
+        if not config_manager.get_history_enabled():
+            return None
+        store = cls(config_manager.get_history_db())
+        return store if store.available else None
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10.0, check_same_thread=check_same_thread)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_schema(self, conn):
+        conn.executescript(SCHEMA)
+        existing = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'generations_fts'").fetchone()
+        rebuild = existing is not None and "trigram" not in existing[0]
+        try:
+            if rebuild:
+                # Index from an older version with the word tokenizer: re-index with trigrams
+                conn.executescript(FTS_DROP)
+            conn.executescript(FTS_SCHEMA)
+            if rebuild:
+                conn.execute("INSERT INTO generations_fts(generations_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: search falls back to LIKE scans
+            logging.warning(f"FTS5 unavailable, history search will be slower: {e}")
+            self.fts = False
+        conn.commit()
+
+    # --- Writing ---
+    def record(self, entry: Dict):
+        """
+        Queues a generation for storage and returns immediately.
+        Missing fields are stored as NULL; `created` defaults to now.
+        """
+        if not self.available:
+            return
+        row = dict(entry)
+        row.setdefault("created", time.time())
+        self._queue.put(tuple(row.get(column) for column in COLUMNS))
+
+    def _write_loop(self):
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        sql = f"INSERT INTO generations ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+        try:
+            while True:
+                item = self._queue.get()
+                rows = []
+                stopping = item is _STOP
+                if not stopping:
+                    rows.append(item)
+                # Drain whatever else is waiting into the same transaction
+                while not stopping and len(rows) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        rows.append(item)
+                if rows:
+                    try:
+                        with conn:
+                            # Inserts and deletes apply in queue order
+                            for deleting, group in itertools.groupby(rows, key=lambda r: isinstance(r, _Delete)):
+                                if deleting:
+                                    conn.executemany("DELETE FROM generations WHERE id = ?",
+                                                     [(d.entry_id,) for d in group])
+                                else:
+                                    conn.executemany(sql, list(group))
+                    except sqlite3.Error as e:
+                        logging.error(f"Error writing generation history: {e}")
+                for _ in range(len(rows) + stopping):
+                    self._queue.task_done()
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def flush(self):
+        """
+        Blocks until everything queued so far is committed.
+        """
+        if self.available:
+            self._queue.join()
+
+    def close(self):
+        """
+        Commits everything queued, then stops the writer. Safe to call twice.
+        """
+        if self._writer and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        if self._reader:
+            with self._read_lock:
+                self._reader.close()
+            self._reader = None
+        self.available = False
+
+    # --- Reading ---
+    def page(self, query: str = "", before_id: Optional[int] = None, limit: int = 50) -> List[Dict]:
+        """
+        Newest-first summaries (previews of the texts) matching `query`. Pass
+        the id of the last row received as `before_id` to get the next page.
+        """
+        if not self._reader:
+            return []
+        before_id = before_id if before_id is not None else 2 ** 63 - 1
+        terms = (query or "").split()
+        if not terms:
+            sql = f"{SUMMARY_SELECT} WHERE id < ? ORDER BY id DESC LIMIT ?"
+            params = (before_id, limit)
+        elif self.fts and min(map(len, terms)) >= TRIGRAM_CHARS:
+            # Let FTS5 pick and order the ids, then fetch just that page
+            sql = (f"{SUMMARY_SELECT} WHERE id IN (SELECT rowid FROM generations_fts WHERE generations_fts MATCH ? "
+                   "AND rowid < ? ORDER BY rowid DESC LIMIT ?) ORDER BY id DESC")
+            params = (_fts_query(terms), before_id, limit)
+        else:
+            # Every term must occur in either text, as with the index
+            condition = " AND ".join(["(original LIKE ? ESCAPE '\\' OR processed LIKE ? ESCAPE '\\')"] * len(terms))
+            sql = f"{SUMMARY_SELECT} WHERE id < ? AND {condition} ORDER BY id DESC LIMIT ?"
+            params = (before_id, *(p for term in terms for p in (_like_pattern(term),) * 2), limit)
+        with self._read_lock:
+            try:
+                return [dict(row) for row in self._reader.execute(sql, params)]
+            except sqlite3.Error as e:
+                logging.error(f"Error reading generation history: {e}")
+                return []
+
+    def get(self, entry_id: int) -> Optional[Dict]:
+        if not self._reader:
+            return None
+        with self._read_lock:
+            row = self._reader.execute("SELECT * FROM generations WHERE id = ?", (entry_id,)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, entry_id: int):
+        """
+        Queues a deletion; like record(), it is applied by the writer thread.
+        """
+        if self.available:
+            self._queue.put(_Delete(entry_id))
+
+    def count(self) -> int:
+        if not self._reader:
+            return 0
+        with self._read_lock:
+            return self._reader.execute("SELECT count(*) FROM generations").fetchone()[0]
+
+    # Async wrappers: run queries in the default executor so the event loop never blocks
+    async def apage(self, query: str = "", before_id: Optional[int] = None, limit: int = 50) -> List[Dict]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.page, query, before_id, limit)
+
+    async def aget(self, entry_id: int) -> Optional[Dict]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, entry_id)
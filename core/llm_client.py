@@ -2,14 +2,101 @@ import httpx
 import json
 import asyncio
 import os
+import logging
+import importlib.util
+from contextlib import aclosing
+
+from .resilience import RetryPolicy, CircuitBreaker, parse_retry_after
+from .sse import aiter_sse, loads as sse_loads
+from .rate_limiter import RateLimiter
+from .tokenizer import StreamTokenCounter, count_message_tokens, get_tokenizer
+from .router import EndpointRouter
+from .metrics import METRICS
+
+# Errors caused by the request itself; every endpoint would reject it the same way
+REQUEST_ERROR_STATUSES = (400, 413, 422)
+
+
+class StreamError(str):
+    """
+    Error text yielded by stream_request. Still a plain string for display,
+    but lets callers tell failures apart from generated content.
+    `status` is the HTTP status code when the failure was an error response.
+    """
+    status = None
+
 
 class LLMClient:
-    def __init__(self):
+    def __init__(self, timeout: float = 60.0, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, http2: bool = False, retry_policy: RetryPolicy = None,
+                 breaker_failure_threshold: int = 5, breaker_reset_timeout: float = 30.0,
+                 requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        if http2 and importlib.util.find_spec("h2") is None:
+            logging.warning("HTTP/2 requested but the 'h2' package is not installed; falling back to HTTP/1.1.")
+            http2 = False
+        self.http2 = http2
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Used for every endpoint but the last when failing over
+        self._single_attempt = RetryPolicy(max_attempts=1)
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self._breakers = {}
+        # Optional multi-endpoint routing; see send_routed/stream_routed
+        self.router = None
+        # Shared by every caller of this client so concurrent runs respect one quota
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
         # httpx Client for persistent connections
-        self._client = httpx.AsyncClient(timeout=60.0)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            )
+        )
+
+    @classmethod
+    def from_config(cls, config_manager):
+        client = cls(
+            timeout=config_manager.get_http_timeout(),
+            max_connections=config_manager.get_http_max_connections(),
+            max_keepalive_connections=config_manager.get_http_max_keepalive_connections(),
+            keepalive_expiry=config_manager.get_http_keepalive_expiry(),
+            http2=config_manager.get_http2_enabled(),
+            retry_policy=RetryPolicy(
+                max_attempts=config_manager.get_retry_max_attempts(),
+                base_delay=config_manager.get_retry_base_delay(),
+                max_delay=config_manager.get_retry_max_delay()
+            ),
+            breaker_failure_threshold=config_manager.get_breaker_failure_threshold(),
+            breaker_reset_timeout=config_manager.get_breaker_reset_timeout(),
+            requests_per_minute=config_manager.get_rate_limit_rpm(),
+            tokens_per_minute=config_manager.get_rate_limit_tpm()
+        )
+        client.router = EndpointRouter.from_config(config_manager, client.endpoint_available)
+        return client
+
+    async def prewarm(self, api_url: str) -> bool:
+        """
+        Opens a pooled connection to the API host ahead of the first request,
+        so DNS, TCP and TLS setup are not paid on the user's first generation.
+        Any HTTP response (even 404/405) counts as success; only the connection matters.
+        """
+        if not api_url:
+            return False
+        try:
+            origin = httpx.URL(api_url).copy_with(path="/", query=None, fragment=None)
+            await self._client.head(origin, timeout=10.0)
+            return True
+        except Exception as exc:
+            logging.debug(f"Connection pre-warm to {api_url} failed: {exc}")
+            return False
 
     async def send_request(self, api_url: str, api_key: str, messages: list,
-                           model: str = "gpt-3.5-turbo", temperature: float = 0.7) -> dict:
+                           model: str = "gpt-3.5-turbo", temperature: float = 0.7,
+                           retry_policy: RetryPolicy = None) -> dict:
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
@@ -20,21 +107,46 @@ class LLMClient:
             "temperature": temperature
         }
 
-        try:
-            response = await self._client.post(api_url, headers=headers, json=payload)
-            response.raise_for_status()  # Raise an exception for 4xx or 5xx status codes
-            return response.json()
-        except httpx.RequestError as exc:
-            return {"error": f"An error occurred while requesting {exc.request.url!r}: {exc}"}
-        except httpx.HTTPStatusError as exc:
-            return {"error": f"Error response {exc.response.status_code} while requesting {exc.request.url!r}: {exc.response.text}"}
-        except json.JSONDecodeError:
-            return {"error": f"Failed to decode JSON response from {api_url}: {response.text}"}
-        except Exception as exc:
-            return {"error": f"An unexpected error occurred: {exc}"}
+        retry_policy = retry_policy or self.retry_policy
+        breaker = self._get_breaker(api_url)
+        tokenizer = get_tokenizer(model)
+        estimated = count_message_tokens(messages, tokenizer)
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                return {"error": self._circuit_open_message(api_url, breaker)}
+            try:
+                await self.rate_limiter.acquire(estimated)
+                with METRICS.span("llm_request_seconds"):
+                    response = await self._client.post(api_url, headers=headers, json=payload)
+                    response.raise_for_status()  # Raise an exception for 4xx or 5xx status codes
+                result = response.json()
+                breaker.record_success()
+                self.rate_limiter.reconcile(estimated, self._usage_tokens(result, estimated, tokenizer))
+                return result
+            except (httpx.RequestError, httpx.HTTPStatusError) as exc:
+                delay = self._handle_failure(exc, attempt, breaker, retry_policy)
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                if isinstance(exc, httpx.HTTPStatusError):
+                    return {"error": f"Error response {exc.response.status_code} while requesting {exc.request.url!r}: {exc.response.text}",
+                            "status": exc.response.status_code}
+                return {"error": f"An error occurred while requesting {exc.request.url!r}: {exc}"}
+            except json.JSONDecodeError:
+                breaker.release()
+                return {"error": f"Failed to decode JSON response from {api_url}: {response.text}"}
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as exc:
+                breaker.release()
+                return {"error": f"An unexpected error occurred: {exc}"}
 
     async def stream_request(self, api_url: str, api_key: str, messages: list,
-                             model: str = "gpt-3.5-turbo", temperature: float = 0.7):
+                             model: str = "gpt-3.5-turbo", temperature: float = 0.7,
+                             retry_policy: RetryPolicy = None):
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
@@ -46,27 +158,216 @@ class LLMClient:
             "stream": True
         }
 
-        try:
-            async with self._client.stream("POST", api_url, headers=headers, json=payload) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        line = line[6:]  # Remove "data: " prefix
-                        if line.strip() == "[DONE]":
+        retry_policy = retry_policy or self.retry_policy
+        breaker = self._get_breaker(api_url)
+        tokenizer = get_tokenizer(model)
+        estimated = count_message_tokens(messages, tokenizer)
+        attempt = 0
+        while True:
+            if not breaker.allow_request():
+                yield StreamError(f"\n[Error: {self._circuit_open_message(api_url, breaker)}]\n")
+                return
+            yielded = False
+            completion = StreamTokenCounter(tokenizer)
+            usage = None
+            try:
+                await self.rate_limiter.acquire(estimated)
+                probe = METRICS.stream_probe("llm")
+                async with self._client.stream("POST", api_url, headers=headers, json=payload) as response:
+                    response.raise_for_status()
+                    probe.connected()
+                    async for event in aiter_sse(response.aiter_bytes()):
+                        if event.raw == b"[DONE]":
+                            break
+                        if event.event == "error":
+                            yield StreamError(f"\n[Provider Error: {event.data}]\n")
                             break
                         try:
-                            chunk = json.loads(line)
-                            delta = chunk["choices"][0]["delta"]
-                            if "content" in delta:
-                                yield delta["content"]
-                        except json.JSONDecodeError:
+                            chunk = sse_loads(event.raw)
+                            usage = chunk.get("usage") or usage
+                            content = chunk["choices"][0]["delta"].get("content")
+                        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
                             continue
-        except httpx.RequestError as exc:
-            yield f"\n[Error: {exc}]\n"
-        except httpx.HTTPStatusError as exc:
-            yield f"\n[HTTP Error {exc.response.status_code}]\n"
-        except Exception as exc:
-            yield f"\n[Unexpected Error: {exc}]\n"
+                        if content:
+                            probe.chunk()
+                            yielded = True
+                            completion.add(content)
+                            yield content
+                breaker.record_success()
+                if usage and usage.get("total_tokens") is not None:
+                    actual = usage["total_tokens"]
+                else:
+                    actual = estimated + completion.total
+                self.rate_limiter.reconcile(estimated, actual)
+                probe.finish((usage or {}).get("completion_tokens") or completion.total)
+                return
+            except (httpx.RequestError, httpx.HTTPStatusError) as exc:
+                # Once content reached the caller a retry would duplicate it
+                delay = None if yielded else self._handle_failure(exc, attempt, breaker, retry_policy)
+                if yielded:
+                    breaker.record_failure()
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                if isinstance(exc, httpx.HTTPStatusError):
+                    error = StreamError(f"\n[HTTP Error {exc.response.status_code}]\n")
+                    error.status = exc.response.status_code
+                    yield error
+                else:
+                    yield StreamError(f"\n[Error: {exc}]\n")
+                return
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cancelled by the caller (or the generator was closed): leaving the
+                # `async with` above closes the response, which drops the half-read
+                # connection instead of draining it, so the provider stops generating
+                breaker.release()
+                raise
+            except Exception as exc:
+                breaker.release()
+                yield StreamError(f"\n[Unexpected Error: {exc}]\n")
+                return
+
+    async def send_routed(self, messages: list, model: str = "gpt-3.5-turbo", temperature: float = 0.7) -> dict:
+        """
+        send_request against the best endpoint of `self.router`, failing over to
+        the next one on errors the other endpoints would not share. Every endpoint
+        but the last gets a single attempt so a failing one costs no backoff;
+        `model` applies to endpoints that do not name their own.
+        """
+        router = self.router
+        candidates = router.candidates()
+        result = {"error": "No endpoints configured"}
+        for i, endpoint in enumerate(candidates):
+            last = i == len(candidates) - 1
+            policy = self.retry_policy if last else self._single_attempt
+            started = router.start(endpoint)
+            try:
+                result = await self.send_request(endpoint.url, endpoint.key, messages, endpoint.model or model,
+                                                 temperature, retry_policy=policy)
+            except BaseException:
+                router.abandon(endpoint)
+                raise
+            if "error" not in result:
+                router.success(endpoint, started)
+                result.setdefault("endpoint", endpoint.name)
+                return result
+            if result.get("status") in REQUEST_ERROR_STATUSES:
+                router.abandon(endpoint)
+                return result
+            router.failure(endpoint, result["error"])
+            if not last:
+                logging.warning(f"Endpoint {endpoint.name} failed, failing over: {result['error']}")
+        return result
+
+    async def stream_routed(self, messages: list, model: str = "gpt-3.5-turbo", temperature: float = 0.7):
+        """
+        Streaming counterpart of send_routed. Failover only happens before the
+        first content chunk; after that the caller has seen output and errors
+        are passed through like stream_request does.
+        """
+        router = self.router
+        candidates = router.candidates()
+        if not candidates:
+            yield StreamError("\n[Error: No endpoints configured]\n")
+            return
+        for i, endpoint in enumerate(candidates):
+            last = i == len(candidates) - 1
+            policy = self.retry_policy if last else self._single_attempt
+            started = router.start(endpoint)
+            yielded = False
+            error = None
+            try:
+                async with aclosing(self.stream_request(endpoint.url, endpoint.key, messages, endpoint.model or model,
+                                                        temperature, retry_policy=policy)) as chunks:
+                    async for chunk in chunks:
+                        if isinstance(chunk, StreamError):
+                            error = chunk
+                            if not yielded and not last and chunk.status not in REQUEST_ERROR_STATUSES:
+                                # Nothing reached the caller yet: try the next endpoint instead
+                                break
+                        elif not yielded:
+                            yielded = True
+                            router.first_token(endpoint, started)
+                        yield chunk
+            except BaseException:
+                router.abandon(endpoint)
+                raise
+            if error is None:
+                router.success(endpoint, started)
+                return
+            if error.status in REQUEST_ERROR_STATUSES:
+                router.abandon(endpoint)
+                return
+            router.failure(endpoint, str(error))
+            if yielded or last:
+                return
+            logging.warning(f"Endpoint {endpoint.name} failed, failing over: {error.strip()}")
+
+    def endpoint_available(self, api_url: str) -> bool:
+        """
+        False while the endpoint's circuit is open and still cooling down.
+        """
+        breaker = self._breakers.get(api_url)
+        return breaker is None or breaker.retry_in() <= 0
+
+    def routing_stats(self) -> list:
+        """
+        Per-endpoint latency, TTFT, error rate and load, or [] without a router.
+        """
+        return self.router.stats() if self.router else []
+
+    @staticmethod
+    def _usage_tokens(result: dict, estimated: int, tokenizer) -> int:
+        """
+        Total tokens billed for a response, falling back to an estimate of the completion.
+        """
+        usage = result.get("usage") or {}
+        if usage.get("total_tokens") is not None:
+            return usage["total_tokens"]
+        try:
+            content = result["choices"][0]["message"]["content"] or ""
+        except (KeyError, IndexError, TypeError):
+            content = ""
+        return estimated + tokenizer.count(content)
+
+    def _get_breaker(self, api_url: str) -> CircuitBreaker:
+        breaker = self._breakers.get(api_url)
+        if breaker is None:
+            breaker = CircuitBreaker(self.breaker_failure_threshold, self.breaker_reset_timeout)
+            self._breakers[api_url] = breaker
+        return breaker
+
+    def _circuit_open_message(self, api_url: str, breaker: CircuitBreaker) -> str:
+        return f"Circuit open for {api_url} after repeated failures; retrying in {breaker.retry_in():.0f}s"
+
+    def _handle_failure(self, exc, attempt: int, breaker: CircuitBreaker, retry_policy: RetryPolicy):
+        """
+        Records a failed attempt on the breaker and returns the delay before the
+        next attempt, or None when the error is permanent or retries are exhausted.
+        Rate limits (429) and other client errors do not count against endpoint health.
+        """
+        METRICS.inc("llm_errors_total")
+        if isinstance(exc, httpx.HTTPStatusError):
+            status = exc.response.status_code
+            if status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.release()
+            if not retry_policy.is_retryable_status(status):
+                return None
+            retry_after = parse_retry_after(exc.response.headers.get("Retry-After"))
+        elif isinstance(exc, httpx.TransportError):
+            breaker.record_failure()
+            retry_after = None
+        else:
+            breaker.release()
+            return None
+
+        # An open circuit means the endpoint is down; fail fast instead of waiting
+        if not retry_policy.can_retry(attempt) or breaker.state == CircuitBreaker.OPEN:
+            return None
+        return retry_policy.backoff(attempt, retry_after)
 
     async def close(self):
         await self._client.aclose()
@@ -0,0 +1,442 @@
+"""
+MCP / JSON-RPC 2.0 server over stdio, so agent tooling can call the prompt
+modes as a tool without launching Flet.
+
+Requests are read as newline-delimited JSON (the MCP stdio transport) or with
+LSP-style Content-Length headers; replies use the framing of the request.
+Every request runs as its own asyncio task, so a slow generation never blocks
+the others, and responses are written as they complete, correlated by `id`.
+JSON-RPC batch arrays run all elements concurrently under the same limit;
+the reply is one array, in submission order or, with --batch-order
+completion, in the order the elements finished.
+
+Usage:
+    python -m core mcp [--config config.json] [--max-concurrency 8] [--batch-order completion]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+
+from ..config_manager import ConfigManager
+from .protocol import MCPRequest, MCPResource, MCPContext
+
+PROTOCOL_VERSION = "2024-11-05"
+SERVER_INFO = {"name": "ning-prompt", "version": "1.2.0"}
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+NDJSON = "ndjson"
+HEADERS = "headers"
+
+BATCH_ORDERS = ("submission", "completion")
+
+
+class JSONRPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FramingError(ValueError):
+    """
+    A header frame that cannot be read; the stream stays usable.
+    """
+
+
+class StdioTransport:
+    """
+    Framed message I/O over a pair of asyncio streams.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._write_lock = asyncio.Lock()
+
+    async def read_message(self):
+        """
+        Returns (raw bytes, framing), or (None, None) at end of input.
+        Raises FramingError for a malformed Content-Length header.
+        """
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return None, None
+            if line.lower().startswith(b"content-length:"):
+                value = line.split(b":", 1)[1].strip()
+                # Skip any further headers up to the blank line
+                while (await self.reader.readline()).strip():
+                    pass
+                if not value.isdigit():
+                    raise FramingError(f"invalid Content-Length: {value.decode('latin-1')!r}")
+                try:
+                    return await self.reader.readexactly(int(value)), HEADERS
+                except asyncio.IncompleteReadError:
+                    # Input ended mid-frame
+                    return None, None
+            if line.strip():
+                return line, NDJSON
+
+    async def write_message(self, message, framing: str = NDJSON):
+        data = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if framing == HEADERS:
+            data = f"Content-Length: {len(data)}\r\n\r\n".encode("ascii") + data
+        else:
+            data += b"\n"
+        async with self._write_lock:
+            self.writer.write(data)
+            await self.writer.drain()
+
+
+class MCPServer:
+    """
+    Dispatches JSON-RPC requests to a PromptProcessor.
+    Supported methods: initialize, ping, tools/list, tools/call, resources/list,
+    resources/read, process_prompt (the native MCPRequest method) and the
+    notifications/initialized and notifications/cancelled notifications.
+    """
+    def __init__(self, processor, max_concurrency: int = 8, batch_order: str = "submission"):
+        self.processor = processor
+        self.batch_order = batch_order if batch_order in BATCH_ORDERS else "submission"
+        self._limit = asyncio.Semaphore(max(1, max_concurrency))
+        self._tasks = {}
+        self._cancelled = set()
+        self._methods = {
+            "initialize": self._initialize,
+            "ping": self._ping,
+            "tools/list": self._tools_list,
+            "tools/call": self._tools_call,
+            "resources/list": self._resources_list,
+            "resources/read": self._resources_read,
+            "process_prompt": self._process_prompt,
+        }
+
+    # --- Serving ---
+    async def serve(self, transport: StdioTransport):
+        """
+        Reads until end of input, then waits for in-flight requests to finish.
+        """
+        pending = set()
+        while True:
+            try:
+                raw, framing = await transport.read_message()
+            except FramingError as e:
+                await transport.write_message(self._error(None, PARSE_ERROR, f"Parse error: {e}"), HEADERS)
+                continue
+            if raw is None:
+                break
+            task = asyncio.create_task(self._handle_raw(raw, framing, transport))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _handle_raw(self, raw: bytes, framing: str, transport: StdioTransport):
+        try:
+            message = json.loads(raw)
+        except ValueError as e:
+            await transport.write_message(self._error(None, PARSE_ERROR, f"Parse error: {e}"), framing)
+            return
+        if isinstance(message, list):
+            await self._handle_batch(message, framing, transport)
+            return
+        response = await self.handle_message(message)
+        if response is not None:
+            await transport.write_message(response, framing)
+
+    async def _handle_batch(self, messages: list, framing: str, transport: StdioTransport):
+        """
+        Runs every element as its own task (so each can be cancelled by id),
+        all sharing the server-wide concurrency limit. Failures stay per element.
+        """
+        if not messages:
+            await transport.write_message(self._error(None, INVALID_REQUEST, "Invalid Request: empty batch"), framing)
+            return
+        tasks = [asyncio.create_task(self.handle_message(message)) for message in messages]
+        try:
+            if self.batch_order == "completion":
+                # JSON-RPC lets batch responses come in any order; ids correlate them
+                results = [await next_done for next_done in asyncio.as_completed(tasks)]
+            else:
+                results = await asyncio.gather(*tasks)
+            responses = [response for response in results if response is not None]
+            # A batch of only notifications gets no reply at all
+            if responses:
+                await transport.write_message(responses, framing)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def handle_message(self, message):
+        """
+        Handles one decoded JSON-RPC message. Returns the response dict, or
+        None for notifications.
+        """
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" or not isinstance(message.get("method"), str):
+            request_id = message.get("id") if isinstance(message, dict) else None
+            return self._error(request_id, INVALID_REQUEST, "Invalid Request")
+
+        method = message["method"]
+        params = message.get("params") or {}
+        is_notification = "id" not in message
+        request_id = message.get("id")
+        if not isinstance(params, dict):
+            return None if is_notification else self._error(request_id, INVALID_PARAMS, "params must be an object")
+
+        if method.startswith("notifications/"):
+            if method == "notifications/cancelled":
+                self._cancel(params.get("requestId"))
+            return None
+
+        handler = self._methods.get(method)
+        if handler is None:
+            return None if is_notification else self._error(request_id, METHOD_NOT_FOUND, f"Method not found: {method}")
+
+        task = asyncio.current_task()
+        if not is_notification:
+            self._tasks[self._task_key(request_id)] = task
+        try:
+            async with self._limit:
+                result = await handler(params)
+        except JSONRPCError as e:
+            return None if is_notification else self._error(request_id, e.code, e.message)
+        except asyncio.CancelledError:
+            if task not in self._cancelled:
+                raise
+            # Cancelled by the client: MCP expects no response for cancelled requests
+            self._cancelled.discard(task)
+            return None
+        except Exception as e:
+            logging.exception(f"MCP method {method} failed")
+            return None if is_notification else self._error(request_id, INTERNAL_ERROR, f"Internal error: {e}")
+        finally:
+            if not is_notification:
+                self._tasks.pop(self._task_key(request_id), None)
+
+        return None if is_notification else {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _cancel(self, request_id):
+        task = self._tasks.pop(self._task_key(request_id), None)
+        if task is not None:
+            self._cancelled.add(task)
+            task.cancel()
+
+    @staticmethod
+    def _task_key(request_id):
+        # JSON-RPC ids may be strings or numbers; keep 1 and "1" apart
+        return (type(request_id).__name__, request_id)
+
+    @staticmethod
+    def _error(request_id, code: int, message: str) -> dict:
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+    # --- Methods ---
+    async def _initialize(self, params):
+        return {
+            "protocolVersion": params.get("protocolVersion") or PROTOCOL_VERSION,
+            "capabilities": {"tools": {"listChanged": False}, "resources": {"listChanged": False}},
+            "serverInfo": SERVER_INFO,
+        }
+
+    async def _ping(self, params):
+        return {}
+
+    async def _tools_list(self, params):
+        from ..prompt_processor import BUILTIN_MODES
+
+        return {"tools": [{
+            "name": "process_prompt",
+            "description": "Rewrite a prompt with one of the prompt-engineering modes "
+                           "(enhance, generalize, repair, pruning) or a custom template.",
+            "inputSchema": {
+                "type": "object",
+                "properties": {
+                    "prompt": {"type": "string", "description": "Original prompt"},
+                    "mode": {"type": "string", "enum": BUILTIN_MODES + ["custom"], "default": "enhance"},
+                    "template": {"type": "string",
+                                 "description": "Custom template (mode=custom): a name or template:// URI from resources/list"},
+                    "temperature": {"type": "number", "minimum": 0, "maximum": 2, "default": 0.7},
+                    "language": {"type": "string", "description": "origin, en, zh or any language name"},
+                    "output_format": {"type": "string", "enum": ["markdown", "plain"]},
+                },
+                "required": ["prompt"],
+            },
+        }]}
+
+    async def _tools_call(self, params):
+        if params.get("name") != "process_prompt":
+            raise JSONRPCError(INVALID_PARAMS, f"Unknown tool: {params.get('name')}")
+        arguments = params.get("arguments") or {}
+        if not isinstance(arguments.get("prompt"), str) or not arguments["prompt"].strip():
+            raise JSONRPCError(INVALID_PARAMS, "arguments.prompt is required")
+
+        template = self._resolve_template(arguments.get("template"))
+        mode = "custom" if template else arguments.get("mode", "enhance")
+        request = self.processor.build_request(
+            mode, arguments["prompt"], arguments.get("temperature", 0.7),
+            arguments.get("language", "origin"), arguments.get("output_format", "markdown"),
+            template
+        )
+        response = await self.processor.execute_mcp_request(request)
+        if response.error and response.error.get("code") == INVALID_PARAMS:
+            # Bad arguments (unknown mode, missing template) are protocol errors; nothing was sent
+            raise JSONRPCError(INVALID_PARAMS, response.error["message"])
+        # Tool failures are reported in the result so the calling model can see them
+        if response.error:
+            return {"content": [{"type": "text", "text": response.error["message"]}], "isError": True}
+        return {
+            "content": [{"type": "text", "text": response.result["processed_prompt"]}],
+            "isError": False,
+            "_meta": response.result.get("meta", {}),
+        }
+
+    async def _process_prompt(self, params):
+        """
+        Native method mirroring MCPRequest(method="process_prompt", params=...).
+        """
+        if not isinstance(params.get("prompt"), str):
+            raise JSONRPCError(INVALID_PARAMS, "params.prompt is required")
+        params = dict(params, mode=params.get("mode") or "enhance",
+                      custom_template_path=self._resolve_template(params.get("custom_template_path")))
+        request = MCPRequest(method="process_prompt", params=params,
+                             context=MCPContext(language=params.get("language", "en")))
+        response = await self.processor.execute_mcp_request(request)
+        if response.error:
+            raise JSONRPCError(response.error.get("code", INTERNAL_ERROR), response.error.get("message", "Error"))
+        return response.result
+
+    def _template_entry(self, name: str):
+        """
+        Catalog entry for a template name (relative to the template directory)
+        or template:// URI, or None. Only catalog templates are ever read.
+        """
+        if name.startswith("template://"):
+            name = name[len("template://"):]
+        catalog = self.processor.loader.catalog
+        return catalog.get(os.path.join(catalog.root, name))
+
+    def _resolve_template(self, template):
+        if not template:
+            return None
+        info = self._template_entry(template) if isinstance(template, str) else None
+        if info is None:
+            raise JSONRPCError(INVALID_PARAMS, f"Unknown template: {template} (see resources/list)")
+        return info.path
+
+    def _template_resources(self):
+        loader = self.processor.loader
+        return [
+            MCPResource(uri=f"template://{t['name']}", name=t["title"] or t["name"])
+            for t in loader.list_custom_templates()
+        ]
+
+    async def _resources_list(self, params):
+        loop = asyncio.get_running_loop()
+        # The first call builds the template catalog, which touches the disk
+        resources = await loop.run_in_executor(None, self._template_resources)
+        return {"resources": [
+            {"uri": r.uri, "name": r.name, "mimeType": r.mimeType} for r in resources
+        ]}
+
+    async def _resources_read(self, params):
+        uri = params.get("uri") or ""
+        info = self._template_entry(uri) if uri.startswith("template://") else None
+        if info is None:
+            raise JSONRPCError(INVALID_PARAMS, f"Unknown resource: {uri}")
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, _read_text, info.path)
+        resource = MCPResource(uri=uri, name=info.title or info.name, content=text)
+        return {"contents": [{"uri": resource.uri, "mimeType": resource.mimeType, "text": resource.content}]}
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class _BlockingWriter:
+    """
+    Minimal StreamWriter stand-in for stdouts that cannot be wrapped as pipes.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+
+    async def drain(self):
+        self.stream.flush()
+
+
+def _pump_stdin(loop, reader: asyncio.StreamReader):
+    for line in iter(sys.stdin.buffer.readline, b""):
+        loop.call_soon_threadsafe(reader.feed_data, line)
+    loop.call_soon_threadsafe(reader.feed_eof)
+
+
+async def _open_stdio():
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=16 * 1024 * 1024)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except (NotImplementedError, ValueError, OSError):
+        # e.g. Windows consoles or regular files: read stdin on a thread instead
+        threading.Thread(target=_pump_stdin, args=(loop, reader), name="mcp-stdin", daemon=True).start()
+    try:
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    except (NotImplementedError, ValueError, OSError):
+        writer = _BlockingWriter(sys.stdout.buffer)
+    return reader, writer
+
+
+def build_parser(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser(prog="python -m core mcp", description="Serve MCP over stdio")
+    parser.add_argument("--config", default="config.json", help="Path to config.json")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Requests processed at once (overrides config mcp_max_concurrency)")
+    parser.add_argument("--batch-order", choices=BATCH_ORDERS, default=None,
+                        help="Order of the responses in the array replying to a batch: as submitted, or as "
+                             "completed (overrides config mcp_batch_order)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    return parser
+
+
+async def main_async(args):
+    from ..prompt_processor import PromptProcessor
+
+    # stdout carries protocol messages only; diagnostics go to stderr
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+
+    config_manager = ConfigManager(args.config)
+    processor = PromptProcessor.from_config(config_manager, use_cache=not args.no_cache)
+    server = MCPServer(processor, args.max_concurrency or config_manager.get_mcp_max_concurrency(),
+                       args.batch_order or config_manager.get_mcp_batch_order())
+    try:
+        reader, writer = await _open_stdio()
+        await server.serve(StdioTransport(reader, writer))
+    finally:
+        await processor.aclose()
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
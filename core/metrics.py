@@ -0,0 +1,266 @@
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+# Prefix for exported metric names
+NAMESPACE = "ning"
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class RollingHistogram:
+    """
+    Samples from the last `window` seconds (at most `max_samples` of them),
+    summarised as quantiles. Lifetime count and sum are kept separately so
+    exported counters never go backwards.
+    """
+    __slots__ = ("window", "samples", "count", "total")
+
+    def __init__(self, window: float = 300.0, max_samples: int = 2048):
+        self.window = window
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float, now: float = None):
+        self.samples.append((now if now is not None else time.monotonic(), value))
+        self.count += 1
+        self.total += value
+
+    def snapshot(self, now: float = None) -> Dict:
+        cutoff = (now if now is not None else time.monotonic()) - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        values = sorted(v for _, v in self.samples)
+        result = {"count": self.count, "sum": self.total, "window_count": len(values)}
+        if values:
+            result["mean"] = sum(values) / len(values)
+            result["max"] = values[-1]
+            for q in QUANTILES:
+                result[f"p{int(q * 100)}"] = values[min(len(values) - 1, int(q * len(values)))]
+        return result
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Only completed work is timed; failures show up in the error counters
+        if exc_type is None:
+            self.metrics.observe(self.name, time.perf_counter() - self.started)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+class StreamProbe:
+    """
+    Times one streamed response: time to headers, time to first token, gaps
+    between chunks and the token rate once the stream ends.
+    """
+    __slots__ = ("metrics", "prefix", "started", "first", "last")
+
+    def __init__(self, metrics, prefix: str):
+        self.metrics = metrics
+        self.prefix = prefix
+        self.started = time.perf_counter()
+        self.first = None
+        self.last = None
+
+    def connected(self):
+        self.metrics.observe(f"{self.prefix}_connect_seconds", time.perf_counter() - self.started)
+
+    def chunk(self):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+            self.metrics.observe(f"{self.prefix}_ttft_seconds", now - self.started)
+        else:
+            self.metrics.observe(f"{self.prefix}_inter_chunk_seconds", now - self.last)
+        self.last = now
+
+    def finish(self, completion_tokens: int):
+        self.metrics.observe(f"{self.prefix}_request_seconds", time.perf_counter() - self.started)
+        if self.first is not None and self.last > self.first and completion_tokens:
+            self.metrics.observe(f"{self.prefix}_tokens_per_second", completion_tokens / (self.last - self.first))
+
+
+class _NullProbe:
+    __slots__ = ()
+
+    def connected(self):
+        pass
+
+    def chunk(self):
+        pass
+
+    def finish(self, completion_tokens: int):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_NULL_PROBE = _NullProbe()
+
+
+class Metrics:
+    """
+    Process-wide registry of rolling histograms and counters. Disabled by
+    default: spans and probes are then shared no-op objects, so instrumented
+    hot paths pay one attribute check. Durations are in seconds.
+    """
+    def __init__(self, enabled: bool = False, window: float = 300.0):
+        self.enabled = enabled
+        self.window = window
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._export_path = ""
+        self._export_interval = 0.0
+        self._exporter = None
+        self._stop = threading.Event()
+        self._atexit_registered = False
+
+    # --- Recording ---
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram(self.window)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def span(self, name: str):
+        """
+        Context manager that records the duration of its block under `name`.
+        """
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def stream_probe(self, prefix: str = "llm"):
+        return StreamProbe(self, prefix) if self.enabled else _NULL_PROBE
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # --- Reading and exporting ---
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "histograms": {name: h.snapshot(now) for name, h in sorted(self._histograms.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(dict(self.snapshot(), timestamp=time.time()), indent=2)
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE {NAMESPACE}_{name} counter")
+            lines.append(f"{NAMESPACE}_{name} {value}")
+        for name, stats in snapshot["histograms"].items():
+            metric = f"{NAMESPACE}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                value = stats.get(f"p{int(q * 100)}")
+                if value is not None:
+                    lines.append(f'{metric}{{quantile="{q}"}} {value:.6g}')
+            lines.append(f"{metric}_sum {stats['sum']:.6g}")
+            lines.append(f"{metric}_count {stats['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Atomically writes the current metrics to `path`: JSON for *.json,
+        Prometheus text exposition format otherwise.
+        """
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def configure(self, enabled: bool, export_path: str = "", export_interval: float = 15.0):
+        """
+        Turns recording on or off and (re)starts the periodic file export.
+        """
+        self.enabled = bool(enabled)
+        self.stop_export()
+        self._export_path = export_path if enabled else ""
+        self._export_interval = export_interval
+        if not self._export_path:
+            return
+        if not self._atexit_registered:
+            # Short-lived CLI runs still leave a final snapshot behind
+            atexit.register(self._final_export)
+            self._atexit_registered = True
+        if export_interval > 0:
+            self._stop.clear()
+            self._exporter = threading.Thread(target=self._export_loop, name="metrics-exporter", daemon=True)
+            self._exporter.start()
+
+    def configure_from(self, config_manager):
+        self.configure(config_manager.get_metrics_enabled(), config_manager.get_metrics_file(),
+                       config_manager.get_metrics_export_interval())
+
+    def stop_export(self):
+        if self._exporter:
+            self._stop.set()
+            self._exporter.join()
+            self._exporter = None
+
+    def _export_loop(self):
+        while not self._stop.wait(self._export_interval):
+            self._export()
+
+    def _export(self):
+        try:
+            self.write(self._export_path)
+        except OSError as e:
+            logging.error(f"Error writing metrics to {self._export_path}: {e}")
+
+    def _final_export(self):
+        if self._export_path:
+            self._export()
+
+
+METRICS = Metrics()
@@ -0,0 +1,254 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .chunking import FENCE_PATTERN
+
+FSYNC_POLICIES = ("never", "interval", "always")
+# Enough of a line to recognise a fence marker
+LINE_HEAD_CHARS = 64
+
+
+class OutputSink:
+    """
+    Appends a streamed generation to a file as it arrives, through a buffered
+    binary writer. The text is split into pages of about `page_bytes`, each
+    cut after a blank line outside fenced code so every page starts a new
+    Markdown block; a page with no such boundary is cut at the next line end
+    (or chunk end, within an endless line) once it reaches four times
+    `page_bytes`, remembering whether a fence was open there (page_in_fence). Only the open page and a few recently read
+    pages are held in memory, so memory stays flat however long the output
+    grows. Earlier pages are read back from disk on demand.
+
+    fsync policy: "never" leaves durability to the OS, "interval" syncs at
+    most every `fsync_interval` seconds while writing, "always" syncs after
+    every chunk. All policies flush and (except "never") sync on close.
+    Writes only flush to the OS; the fsync itself runs on a background
+    thread, so a slow disk never stalls the caller (the UI event loop).
+    Requests made while a sync is running are coalesced into the next one.
+    The thread is not a daemon: the final sync completes before exit.
+
+    `record_limit` caps how much of the output recorded_text() will read back
+    into memory for the response cache and history.
+    """
+    def __init__(self, path: str, fsync: str = "interval", fsync_interval: float = 1.0,
+                 buffer_size: int = 64 * 1024, page_bytes: int = 16 * 1024, cached_pages: int = 4,
+                 record_limit: int = 1_000_000):
+        self.path = path
+        self.record_limit = record_limit
+        self.fsync = fsync if fsync in FSYNC_POLICIES else "interval"
+        self.fsync_interval = fsync_interval
+        self.page_bytes = page_bytes
+        self.cached_pages = cached_pages
+        self.bytes_written = 0
+        self.chars_written = 0
+        # Byte offset where each page starts; the last page is the open one
+        self._marks = [0]
+        self._open_page = []
+        self._open_page_bytes = 0
+        # Whether each page starts inside fenced code (only after a forced cut)
+        self._page_fences = [False]
+        # Line scanning state: fence open, start of the current line, whether it is blank so far
+        self._in_fence = False
+        self._line_head = ""
+        self._line_blank = True
+        self._cache = OrderedDict()
+        self._last_sync = time.monotonic()
+        self._sync_wanted = threading.Event()
+        self._flusher = None
+        self._stopping = False
+        self.closed = False
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb", buffering=buffer_size)
+
+    @classmethod
+    def from_config(cls, config_manager, path: str):
+        return cls(path, fsync=config_manager.get_output_fsync(),
+                   fsync_interval=config_manager.get_output_fsync_interval(),
+                   record_limit=config_manager.get_output_record_max_chars())
+
+    # --- Writing ---
+    def write(self, chunk: str):
+        if not chunk or self.closed:
+            return
+        data = chunk.encode("utf-8")
+        self._file.write(data)
+        self.bytes_written += len(data)
+        self.chars_written += len(chunk)
+
+        # Cut pages at the first block boundary past page_bytes (forced past 4x)
+        remaining = len(data)
+        taken = 0
+        pending = 0  # Bytes of chunk[taken:line_start]
+        line_start = 0
+        full = self._open_page_bytes + remaining >= self.page_bytes
+        while True:
+            end = chunk.find("\n", line_start)
+            if end == -1:
+                break
+            boundary = self._end_line(chunk[line_start:end])
+            if full:
+                pending += len(chunk[line_start:end + 1].encode("utf-8"))
+            line_start = end + 1
+            if not full or self._open_page_bytes + pending < (self.page_bytes if boundary else 4 * self.page_bytes):
+                continue
+            self._add_to_page(chunk[taken:line_start], pending)
+            self._close_page()
+            remaining -= pending
+            taken, pending = line_start, 0
+            full = remaining >= self.page_bytes
+        self._continue_line(chunk[line_start:])
+        if taken < len(chunk):
+            self._add_to_page(chunk[taken:] if taken else chunk, remaining)
+            if self._open_page_bytes >= 4 * self.page_bytes:
+                # No line end in sight (one endless line): cut at the chunk boundary
+                self._close_page()
+
+        if self.fsync == "always":
+            self._sync()
+        elif self.fsync == "interval" and time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync()
+
+    def _end_line(self, rest: str) -> bool:
+        """
+        Completes the current line with `rest`. True when it is a blank line
+        outside fenced code, i.e. the next line starts a new block.
+        """
+        self._continue_line(rest)
+        blank = self._line_blank
+        if not blank and FENCE_PATTERN.match(self._line_head):
+            self._in_fence = not self._in_fence
+        self._line_head = ""
+        self._line_blank = True
+        return blank and not self._in_fence
+
+    def _continue_line(self, text: str):
+        if len(self._line_head) < LINE_HEAD_CHARS:
+            self._line_head += text[:LINE_HEAD_CHARS - len(self._line_head)]
+        if self._line_blank and text.strip():
+            self._line_blank = False
+
+    def _add_to_page(self, text: str, size: int):
+        self._open_page.append(text)
+        self._open_page_bytes += size
+
+    def _close_page(self):
+        # The finished page stays cached: it is the one the UI shows next to the open page
+        self._remember(len(self._marks) - 1, "".join(self._open_page))
+        self._marks.append(self._marks[-1] + self._open_page_bytes)
+        self._page_fences.append(self._in_fence)
+        self._open_page = []
+        self._open_page_bytes = 0
+
+    def _sync(self):
+        self._file.flush()
+        self._last_sync = time.monotonic()
+        if self._flusher is None:
+            # The flusher owns a duplicate descriptor, so the file can close while a sync runs
+            self._flusher = threading.Thread(target=self._sync_loop, args=(os.dup(self._file.fileno()),),
+                                             name="output-fsync")
+            self._flusher.start()
+        self._sync_wanted.set()
+
+    def _sync_loop(self, fd: int):
+        try:
+            while True:
+                self._sync_wanted.wait()
+                self._sync_wanted.clear()
+                stopping = self._stopping
+                try:
+                    os.fsync(fd)
+                except OSError as e:
+                    logging.warning(f"fsync failed for {self.path}: {e}")
+                if stopping:
+                    return
+        finally:
+            os.close(fd)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.fsync == "never":
+                self._file.flush()
+            else:
+                self._stopping = True
+                self._sync()
+        finally:
+            self._file.close()
+
+    # --- Reading ---
+    @property
+    def page_count(self) -> int:
+        return len(self._marks)
+
+    def page_in_fence(self, index: int) -> bool:
+        return self._page_fences[index]
+
+    def page_text(self, index: int) -> str:
+        if index == len(self._marks) - 1:
+            return "".join(self._open_page)
+        cached = self._cache.get(index)
+        if cached is not None:
+            self._cache.move_to_end(index)
+            return cached
+        text = self._read_bytes(self._marks[index], self._marks[index + 1]).decode("utf-8")
+        self._remember(index, text)
+        return text
+
+    def read_all(self) -> str:
+        """
+        The whole output. Unbounded by nature; meant for copy/export.
+        """
+        return self._read_bytes(0, self.bytes_written).decode("utf-8")
+
+    def recorded_text(self):
+        """
+        The whole output for caching and history, or None when it is longer
+        than `record_limit` characters and should not be held in memory.
+        """
+        if self.chars_written > self.record_limit:
+            return None
+        return self.read_all()
+
+    def _read_bytes(self, start: int, end: int) -> bytes:
+        if not self.closed:
+            self._file.flush()
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def _remember(self, index: int, text: str):
+        self._cache[index] = text
+        self._cache.move_to_end(index)
+        while len(self._cache) > self.cached_pages:
+            self._cache.popitem(last=False)
+
+
+def prune_spool(directory: str, keep: int, exclude: str = None):
+    """
+    Deletes all but the `keep` newest files in a spool directory. At least
+    the newest file is always kept, and `exclude` (the output still on
+    screen) never counts or goes.
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    try:
+        entries = sorted((e for e in os.scandir(directory) if os.path.abspath(e.path) != exclude),
+                         key=lambda e: e.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for entry in entries[max(keep, 0 if exclude else 1):]:
+        if entry.is_file():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def spool_path(directory: str, prefix: str = "generation") -> str:
+    return os.path.join(directory, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}.md")
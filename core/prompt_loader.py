@@ -1,39 +1,151 @@
 import os
+import re
+import asyncio
 import logging
-import glob
+import threading
+import hashlib
 from typing import List, Dict
 
+from .metrics import METRICS
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+FRONT_MATTER_PATTERN = re.compile(r"\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)", re.DOTALL)
+
+
+def _parse_simple_yaml(block: str) -> dict:
+    """
+    Minimal fallback for `key: value` front-matter when PyYAML is not installed.
+    Supports scalars, inline lists ([a, b]) and block lists (- item).
+    """
+    meta = {}
+    current = None
+    for raw in block.splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("- ") and current is not None:
+            meta.setdefault(current, [])
+            if isinstance(meta[current], list):
+                meta[current].append(line[2:].strip().strip("'\""))
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        current = key.strip()
+        value = value.strip()
+        if value.startswith("[") and value.endswith("]"):
+            meta[current] = [v.strip().strip("'\"") for v in value[1:-1].split(",") if v.strip()]
+        elif value:
+            meta[current] = value.strip("'\"")
+        else:
+            meta[current] = []
+    return meta
+
+
+def parse_front_matter(text: str):
+    """
+    Splits a template into (metadata dict, body). Templates without a leading
+    `---` block are returned unchanged with empty metadata.
+    """
+    match = FRONT_MATTER_PATTERN.match(text)
+    if not match:
+        return {}, text
+    block = match.group(1)
+    meta = None
+    try:
+        # Optional: full YAML front-matter support; imported here to keep startup light
+        import yaml
+    except ImportError:
+        yaml = None
+    if yaml is not None:
+        try:
+            meta = yaml.safe_load(block)
+        except yaml.YAMLError as e:
+            logging.warning(f"Invalid template front-matter, using simple parser: {e}")
+    if not isinstance(meta, dict):
+        meta = _parse_simple_yaml(block)
+    return meta, text[match.end():]
+
+
+class CompiledTemplate:
+    """
+    A template parsed once into literal segments plus a placeholder index.
+    Rendering copies the segment list, fills the indexed slots and joins once,
+    so the cost is linear in the output size regardless of placeholder count.
+    """
+    def __init__(self, text: str, mtime_ns: int = 0, size: int = 0):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.segments = []
+        self.slots = {}
+
+        pos = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > pos:
+                self.segments.append(text[pos:match.start()])
+            # Keep the raw placeholder so unknown names render unchanged
+            self.slots.setdefault(match.group(1), []).append(len(self.segments))
+            self.segments.append(match.group(0))
+            pos = match.end()
+        if pos < len(text):
+            self.segments.append(text[pos:])
+
+    def render(self, values: Dict[str, str]) -> str:
+        parts = list(self.segments)
+        for name, indices in self.slots.items():
+            value = values.get(name)
+            if value is None:
+                continue
+            for i in indices:
+                parts[i] = value
+        return "".join(parts)
+
+
 class PromptLoader:
     def __init__(self, prompts_dir=None, custom_dir=None):
         # Default internal prompts
         self.internal_dir = os.path.join(os.path.dirname(__file__), "prompts")
         if prompts_dir:
             self.internal_dir = prompts_dir
-            
+
         # Directory for custom templates (now also core/prompts)
         self.custom_dir = self.internal_dir # Changed to point to internal prompts directory
 
+        # Compiled templates keyed by path, invalidated by mtime/size
+        self._compiled = {}
+        self._catalog = None
+        self._catalog_lock = threading.Lock()
+
+    @property
+    def catalog(self):
+        """
+        Template catalog for the custom directory, built on first use and kept
+        current by a filesystem watcher from then on.
+        """
+        with self._catalog_lock:
+            if self._catalog is None:
+                from .template_catalog import TemplateCatalog
+
+                catalog = TemplateCatalog(self.custom_dir)
+                catalog.scan()
+                catalog.start_watching()
+                self._catalog = catalog
+        return self._catalog
+
     def list_custom_templates(self) -> List[Dict[str, str]]:
         """
-        Scans the custom directory for .md files.
-        Returns a list of dicts: {'name': 'filename', 'path': 'abs_path'}
+        Lists every .md template under the custom directory, nested folders included.
+        Returns a list of dicts: {'name': 'relative/path.md', 'path': 'abs_path',
+        'title', 'description', 'tags', 'placeholders'} served from the in-memory catalog.
         """
-        templates = []
-        try:
-            # Use glob to find .md files in the custom directory (non-recursive for safety/simplicity)
-            search_pattern = os.path.join(self.custom_dir, "*.md")
-            files = glob.glob(search_pattern)
-            
-            for f in files:
-                filename = os.path.basename(f)
-                templates.append({
-                    "name": filename,
-                    "path": os.path.abspath(f)
-                })
-        except Exception as e:
-            logging.error(f"Error scanning for templates: {e}")
-        
-        return templates
+        return [info.to_dict() for info in self.catalog.list()]
+
+    def find_templates(self, prefix: str = None, tag: str = None) -> List[Dict[str, str]]:
+        """
+        Catalog lookup by name/title prefix and/or tag.
+        """
+        return [info.to_dict() for info in self.catalog.find(prefix, tag)]
 
     def load_prompt(self, mode: str, original_prompt: str, language: str = "en", output_format: str = "markdown", custom_path: str = None) -> str:
         """
@@ -41,30 +153,98 @@ class PromptLoader:
         If mode is 'custom', it tries to load from 'custom_path'.
         Otherwise loads from internal directory.
         """
-        if mode == "custom" and custom_path:
-            file_path = custom_path
-        else:
-            file_path = os.path.join(self.internal_dir, f"{mode}.md")
-        
+        file_path = self.get_template_path(mode, custom_path)
+
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                template = f.read()
+            with METRICS.span("template_load_seconds"):
+                compiled = self._get_compiled(file_path)
         except FileNotFoundError:
             logging.error(f"Prompt template not found: {file_path}")
             return f"Error: Template not found at {file_path}"
         except Exception as e:
             return f"Error loading template: {e}"
 
-        # Construct instructions based on parameters
-        lang_instruction = self._get_language_instruction(language)
-        format_instruction = self._get_format_instruction(output_format)
+        return self._render(compiled, original_prompt, language, output_format)
+
+    async def aload_prompt(self, mode: str, original_prompt: str, language: str = "en", output_format: str = "markdown", custom_path: str = None) -> str:
+        """
+        Async variant of load_prompt. Template files are only read on a cache
+        miss, and then in the default executor so the event loop never blocks.
+        """
+        file_path = self.get_template_path(mode, custom_path)
+
+        try:
+            with METRICS.span("template_load_seconds"):
+                compiled = await self._aget_compiled(file_path)
+        except FileNotFoundError:
+            logging.error(f"Prompt template not found: {file_path}")
+            return f"Error: Template not found at {file_path}"
+        except Exception as e:
+            return f"Error loading template: {e}"
+
+        return self._render(compiled, original_prompt, language, output_format)
+
+    def get_template_path(self, mode: str, custom_path: str = None) -> str:
+        if mode == "custom" and custom_path:
+            return custom_path
+        return os.path.join(self.internal_dir, f"{mode}.md")
+
+    def get_template_digest(self, mode: str, custom_path: str = None) -> str:
+        """
+        Returns a sha256 of the template file contents, or None if it cannot be read.
+        Used to key cached responses so edits to a template invalidate them.
+        """
+        try:
+            return self._get_compiled(self.get_template_path(mode, custom_path)).digest
+        except OSError:
+            return None
+
+    async def aget_template_digest(self, mode: str, custom_path: str = None) -> str:
+        try:
+            compiled = await self._aget_compiled(self.get_template_path(mode, custom_path))
+            return compiled.digest
+        except OSError:
+            return None
+
+    # --- Compiled template cache ---
+    def _lookup(self, file_path: str):
+        """
+        Returns (compiled or None, stat). A stale or missing entry yields None.
+        """
+        st = os.stat(file_path)
+        compiled = self._compiled.get(file_path)
+        if compiled and compiled.mtime_ns == st.st_mtime_ns and compiled.size == st.st_size:
+            return compiled, st
+        return None, st
+
+    def _compile_file(self, file_path: str, st) -> CompiledTemplate:
+        with open(file_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        # Front-matter is catalog metadata, never part of the prompt
+        _, body = parse_front_matter(text)
+        compiled = CompiledTemplate(body, st.st_mtime_ns, st.st_size)
+        self._compiled[file_path] = compiled
+        return compiled
+
+    def _get_compiled(self, file_path: str) -> CompiledTemplate:
+        compiled, st = self._lookup(file_path)
+        if compiled is None:
+            compiled = self._compile_file(file_path, st)
+        return compiled
 
-        # Replace placeholders
-        filled_prompt = template.replace("{{original_prompt}}", original_prompt)
-        filled_prompt = filled_prompt.replace("{{language_instruction}}", lang_instruction)
-        filled_prompt = filled_prompt.replace("{{format_instruction}}", format_instruction)
+    async def _aget_compiled(self, file_path: str) -> CompiledTemplate:
+        compiled, st = self._lookup(file_path)
+        if compiled is None:
+            loop = asyncio.get_running_loop()
+            compiled = await loop.run_in_executor(None, self._compile_file, file_path, st)
+        return compiled
 
-        return filled_prompt
+    def _render(self, compiled: CompiledTemplate, original_prompt: str, language: str, output_format: str) -> str:
+        return compiled.render({
+            "original_prompt": original_prompt,
+            "language_instruction": self._get_language_instruction(language),
+            "format_instruction": self._get_format_instruction(output_format),
+        })
 
     def _get_language_instruction(self, language: str) -> str:
         if language == "zh":
@@ -1,21 +1,212 @@
-from .llm_client import LLMClient
+from .llm_client import LLMClient, StreamError
 from .prompt_loader import PromptLoader
+from .response_cache import ResponseCache, make_cache_key
+from .single_flight import SingleFlight
+from .chunking import split_structural
+from .tokenizer import TokenBudget, count_message_tokens, get_tokenizer
+from .metrics import METRICS
+from .history_store import HistoryStore
+from .output_sink import OutputSink
 from .mcp.protocol import MCPRequest, MCPResponse, MCPContext # Import MCP classes
 import asyncio
+import contextlib
 import json
+import logging
+import time
+
+BUILTIN_MODES = ["enhance", "generalize", "repair", "pruning"]
+
+
+class TemplateError(ValueError):
+    """
+    An unknown mode or a template that cannot be read; raised before anything is sent upstream.
+    """
 
 class PromptProcessor:
-    def __init__(self, llm_client: LLMClient, api_url: str, api_key: str, model: str = "gpt-3.5-turbo"):
+    def __init__(self, llm_client: LLMClient, api_url: str, api_key: str, model: str = "gpt-3.5-turbo",
+                 cache: ResponseCache = None, budget: TokenBudget = None, history: HistoryStore = None):
         self.llm_client = llm_client
         self.api_url = api_url
         self.api_key = api_key
         self.model = model
         self.loader = PromptLoader()
+        self.cache = cache
+        self.budget = budget
+        self.history = history
+        self.flights = SingleFlight()
+
+    @classmethod
+    def from_config(cls, config_manager, use_cache: bool = True):
+        """
+        Builds a processor with the client, cache, token budget and history
+        store configured in `config_manager`, and applies its metrics settings.
+        Release it with aclose().
+        """
+        METRICS.configure_from(config_manager)
+        return cls(LLMClient.from_config(config_manager), config_manager.get_api_url(), config_manager.get_api_key(),
+                   config_manager.get_model(), cache=ResponseCache.from_config(config_manager) if use_cache else None,
+                   budget=TokenBudget.from_config(config_manager), history=HistoryStore.from_config(config_manager))
+
+    async def aclose(self):
+        """
+        Closes the HTTP client and commits queued history entries.
+        """
+        try:
+            await self.llm_client.close()
+        finally:
+            if self.history:
+                self.history.close()
+
+    def _flight_key(self, messages: list, temperature: float, stream: bool) -> str:
+        """
+        Identity of an upstream call: the fully rendered messages plus everything sent alongside them.
+        """
+        return make_cache_key(messages=messages, model=self.model, temperature=temperature,
+                              api_url=self._target(), stream=stream)
+
+    def _target(self) -> str:
+        # With endpoint routing any configured backend may answer, so they share one identity
+        router = self.llm_client.router
+        if router:
+            return "routed:" + ",".join(sorted(e.url for e in router.endpoints))
+        return self.api_url
+
+    def is_configured(self) -> bool:
+        return bool(self.llm_client.router) or bool(self.api_url and self.api_key)
+
+    async def _send(self, messages: list, temperature: float) -> dict:
+        if self.llm_client.router:
+            return await self.llm_client.send_routed(messages, self.model, temperature)
+        return await self.llm_client.send_request(self.api_url, self.api_key, messages, self.model, temperature)
+
+    def _stream(self, messages: list, temperature: float):
+        if self.llm_client.router:
+            return self.llm_client.stream_routed(messages, self.model, temperature)
+        return self.llm_client.stream_request(self.api_url, self.api_key, messages, self.model, temperature)
+
+    def _record_history(self, mode, custom_path, original_prompt, content, temperature, started,
+                        prompt_tokens, completion_tokens=None):
+        """
+        Queues a finished upstream generation for the history store; never blocks.
+        """
+        if not self.history:
+            return
+        if completion_tokens is None:
+            completion_tokens = get_tokenizer(self.model).count(content)
+        self.history.record({
+            "mode": mode,
+            "template": custom_path if mode == "custom" else mode,
+            "model": self.model,
+            "temperature": temperature,
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "original": original_prompt,
+            "processed": content,
+        })
+
+    @staticmethod
+    def _messages(system_prompt: str) -> list:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "Begin task."}
+        ]
+
+    def budget_limit(self):
+        """
+        (max_tokens, action) for the current model, or None when unbudgeted.
+        """
+        return self.budget.limit_for(self.model) if self.budget else None
+
+    async def count_prompt_tokens(self, mode: str, original_prompt: str, language: str = "en",
+                                  output_format: str = "markdown", custom_path: str = None) -> int:
+        """
+        Token cost of the messages a run would send (template plus prompt).
+        Uses the compiled template cache; a template is only read from disk,
+        in the executor, the first time or after it changed.
+        """
+        system_prompt = await self.loader.aload_prompt(mode, original_prompt or "", language, output_format, custom_path)
+        return count_message_tokens(self._messages(system_prompt), get_tokenizer(self.model))
+
+    async def check_template(self, mode: str, custom_path: str = None) -> str:
+        """
+        Raises TemplateError unless `mode` is a known mode whose template can
+        be read. Returns the template's digest; the template is compiled (and
+        cached) on the way. Every request path calls this before sending.
+        """
+        modes = BUILTIN_MODES + ["custom"]
+        if mode not in modes:
+            raise TemplateError(f"Unknown mode: {mode!r} (expected one of {', '.join(modes)})")
+        if mode == "custom" and not custom_path:
+            raise TemplateError("A template is required for mode 'custom'")
+        try:
+            digest = await self.loader.aget_template_digest(mode, custom_path)
+        except ValueError as e:
+            raise TemplateError(f"Cannot read template {self.loader.get_template_path(mode, custom_path)}: {e}")
+        if digest is None:
+            raise TemplateError(f"Template not found: {self.loader.get_template_path(mode, custom_path)}")
+        return digest
+
+    async def _build_messages(self, mode, prompt, language, output_format, custom_path):
+        """
+        Renders the template and enforces the model's token budget before anything is sent.
+        Returns (messages, prompt_tokens, error); messages is None when the budget refuses.
+        """
+        with METRICS.span("request_build_seconds"):
+            return await self._budgeted_messages(mode, prompt, language, output_format, custom_path)
+
+    async def _budgeted_messages(self, mode, prompt, language, output_format, custom_path):
+        tokenizer = get_tokenizer(self.model)
+        messages = self._messages(await self.loader.aload_prompt(mode, prompt, language, output_format, custom_path))
+        tokens = count_message_tokens(messages, tokenizer)
+        limit = self.budget_limit()
+        if limit is None or tokens <= limit[0]:
+            return messages, tokens, None
+
+        max_tokens, action = limit
+        if action == "truncate" and prompt:
+            # Only the user's prompt is shortened; the template's instructions stay intact
+            keep = tokenizer.count(prompt)
+            for _ in range(3):
+                keep -= tokens - max_tokens
+                if keep <= 0:
+                    break
+                truncated = tokenizer.truncate(prompt, keep)
+                messages = self._messages(await self.loader.aload_prompt(mode, truncated, language, output_format, custom_path))
+                tokens = count_message_tokens(messages, tokenizer)
+                if tokens <= max_tokens:
+                    logging.warning(f"Prompt truncated to fit the {max_tokens}-token budget for {self.model}")
+                    return messages, tokens, None
+            # The template alone does not fit
+            action = "refuse"
+
+        if action == "refuse":
+            return None, tokens, f"Prompt is {tokens} tokens, over the {max_tokens}-token budget for {self.model}"
+        logging.warning(f"Prompt is {tokens} tokens, over the {max_tokens}-token budget for {self.model}; sending anyway")
+        return messages, tokens, None
+
+    def _cache_key(self, mode, prompt, temperature, language, output_format, digest):
+        """
+        Key covering every input that affects the generation, including the
+        template contents (by the digest from check_template).
+        """
+        if not self.cache:
+            return None
+        return make_cache_key(
+            mode=mode, prompt=prompt, temperature=temperature, language=language,
+            output_format=output_format, model=self.model, api_url=self._target(),
+            template=digest
+        )
 
-    async def _execute_mcp_request(self, request: MCPRequest) -> MCPResponse:
+    async def execute_mcp_request(self, request: MCPRequest) -> MCPResponse:
         """
-        Core execution logic adhering to MCP.
+        Core execution logic adhering to MCP. The response carries the request's id.
         """
+        response = await self._run_mcp_request(request)
+        response.id = request.id
+        return response
+
+    async def _run_mcp_request(self, request: MCPRequest) -> MCPResponse:
         if request.method != "process_prompt":
             return MCPResponse(error={"code": -32601, "message": "Method not found"})
 
@@ -27,42 +218,74 @@ class PromptProcessor:
         fmt = params.get("output_format", "markdown")
         custom_path = params.get("custom_template_path")
 
-        # Load Prompt
-        system_prompt = self.loader.load_prompt(mode, prompt, lang, fmt, custom_path)
-        
-        # Prepare LLM Request
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": "Begin task."}
-        ]
+        try:
+            digest = await self.check_template(mode, custom_path)
+        except TemplateError as e:
+            return MCPResponse(error={"code": -32602, "message": f"Invalid params: {e}"})
 
-        # Call LLM (non-streaming for process_prompt's internal use)
-        llm_response = await self.llm_client.send_request(
-            self.api_url, self.api_key, messages, self.model, temp
-        )
+        cache_key = self._cache_key(mode, prompt, temp, lang, fmt, digest)
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return MCPResponse(result={
+                    "processed_prompt": cached["content"],
+                    "explanation": "Served from cache.",
+                    "meta": {
+                        "model": self.model,
+                        "mode": mode,
+                        "cached": True
+                    }
+                })
+
+        # Load Prompt and prepare the LLM request within the token budget
+        messages, prompt_tokens, budget_error = await self._build_messages(mode, prompt, lang, fmt, custom_path)
+        if budget_error:
+            return MCPResponse(error={"code": -32002, "message": budget_error})
+
+        # Call LLM (non-streaming for process_prompt's internal use).
+        # Identical concurrent requests share a single upstream call.
+        model = self.model
+
+        async def call_llm():
+            started = time.monotonic()
+            response = await self._send(messages, temp)
+            if "error" not in response:
+                try:
+                    content = response["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError):
+                    return response
+                usage = response.get("usage") or {}
+                self._record_history(mode, custom_path, prompt, content, temp, started,
+                                     usage.get("prompt_tokens", prompt_tokens), usage.get("completion_tokens"))
+                if cache_key:
+                    await self.cache.put(cache_key, content, {"model": model, "mode": mode})
+            return response
+
+        llm_response = await self.flights.do(self._flight_key(messages, temp, stream=False), call_llm)
 
         if "error" in llm_response:
             return MCPResponse(error={"code": -32000, "message": llm_response["error"]})
 
         try:
             content = llm_response["choices"][0]["message"]["content"]
+            meta = {
+                "model": self.model,
+                "mode": mode,
+                "prompt_tokens": prompt_tokens
+            }
+            if "endpoint" in llm_response:
+                meta["endpoint"] = llm_response["endpoint"]
             return MCPResponse(result={
                 "processed_prompt": content,
                 "explanation": "Generated via MCP.",
-                "meta": {
-                    "model": self.model,
-                    "mode": mode
-                }
+                "meta": meta
             })
         except (KeyError, IndexError) as e:
             return MCPResponse(error={"code": -32001, "message": f"Parse Error: {e}"})
 
-    async def process_prompt(self, mode: str, original_prompt: str, temperature: float, language: str, output_format: str, custom_path: str = None) -> dict:
-        """
-        Bridge method for UI to call MCP execution (non-streaming).
-        """
-        # Create MCP Request
-        req = MCPRequest(
+    def build_request(self, mode: str, original_prompt: str, temperature: float, language: str, output_format: str,
+                      custom_path: str = None, request_id: str = None) -> MCPRequest:
+        return MCPRequest(
             method="process_prompt",
             params={
                 "mode": mode,
@@ -72,11 +295,19 @@ class PromptProcessor:
                 "output_format": output_format,
                 "custom_template_path": custom_path
             },
+            id=request_id,
             context=MCPContext(language=language)
         )
 
+    async def process_prompt(self, mode: str, original_prompt: str, temperature: float, language: str, output_format: str, custom_path: str = None) -> dict:
+        """
+        Bridge method for UI to call MCP execution (non-streaming).
+        """
+        # Create MCP Request
+        req = self.build_request(mode, original_prompt, temperature, language, output_format, custom_path)
+
         # Execute
-        resp = await self._execute_mcp_request(req)
+        resp = await self.execute_mcp_request(req)
 
         # Map back to dict for UI
         if resp.error:
@@ -84,18 +315,291 @@ class PromptProcessor:
         
         return resp.result
 
-    async def stream_prompt(self, mode: str, original_prompt: str, temperature: float, language: str, output_format: str, custom_path: str = None):
+    async def process_batch(self, items, concurrency: int = 4, language: str = "en", output_format: str = "markdown"):
+        """
+        Runs many prompts through the MCP execution path with at most
+        `concurrency` requests in flight. `items` may be a sync or async
+        iterable of dicts with keys: prompt, mode, template, temperature,
+        language, output_format and id. Results are yielded in completion
+        order as dicts carrying the input `index` and `id`.
+        Items are pulled lazily, so memory stays flat for any input size.
+        """
+        concurrency = max(1, int(concurrency))
+        pending = asyncio.Queue(maxsize=concurrency)
+        results = asyncio.Queue(maxsize=concurrency)
+        done = object()
+
+        async def produce():
+            index = 0
+            error = None
+            try:
+                if hasattr(items, "__aiter__"):
+                    async for item in items:
+                        await pending.put((index, item))
+                        index += 1
+                else:
+                    for item in items:
+                        await pending.put((index, item))
+                        index += 1
+            except Exception as e:
+                error = e
+            # Always release the workers, even if reading the input failed
+            for _ in range(concurrency):
+                await pending.put(done)
+            if error:
+                raise error
+
+        async def work():
+            while True:
+                entry = await pending.get()
+                if entry is done:
+                    await results.put(done)
+                    return
+                index, item = entry
+                await results.put(await self._run_batch_item(index, item, language, output_format))
+
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(work()) for _ in range(concurrency)]
+        try:
+            finished = 0
+            while finished < concurrency:
+                result = await results.get()
+                if result is done:
+                    finished += 1
+                    continue
+                yield result
+            await tasks[0]  # Surface errors raised while reading the input
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_batch_item(self, index: int, item, language: str, output_format: str) -> dict:
+        if not isinstance(item, dict):
+            return {"index": index, "id": None, "error": {"code": -32602, "message": "Invalid params: expected an object"}}
+        if "error" in item and "prompt" not in item:
+            # Input lines that failed to parse upstream are passed through as-is
+            return {"index": index, "id": item.get("id"), "error": item["error"]}
+
+        template = item.get("template")
+        mode = item.get("mode") or ("custom" if template else "enhance")
+        req = self.build_request(
+            mode, item.get("prompt", ""), item.get("temperature", 0.7),
+            item.get("language", language), item.get("output_format", output_format),
+            template, item.get("id")
+        )
+
+        try:
+            resp = await self.execute_mcp_request(req)
+        except Exception as e:
+            resp = MCPResponse(error={"code": -32603, "message": f"Internal error: {e}"})
+
+        record = {"index": index, "id": req.id, "mode": mode}
+        if resp.error:
+            record["error"] = resp.error
+        else:
+            record.update(resp.result)
+        return record
+
+    async def stream_prompt(self, mode: str, original_prompt: str, temperature: float, language: str, output_format: str,
+                            custom_path: str = None, sink: OutputSink = None):
         """
         Streaming version of process_prompt. Yields chunks of text.
+        Cache hits are replayed as a single chunk. With `sink`, generated text
+        (not errors) is also appended to its file as it arrives, and nothing
+        keeps the full text in memory: the stream is not coalesced (a shared
+        flight buffers every chunk for late joiners), and the cache and history
+        read the finished text back from the sink, up to its record_limit.
         """
-        full_prompt = self.loader.load_prompt(mode, original_prompt, language, output_format, custom_path)
-        
-        messages = [
-            {"role": "system", "content": full_prompt},
-            {"role": "user", "content": "Begin task."}
-        ]
+        try:
+            digest = await self.check_template(mode, custom_path)
+        except TemplateError as e:
+            yield StreamError(f"\n[Error: {e}]\n")
+            return
+
+        cache_key = self._cache_key(mode, original_prompt, temperature, language, output_format, digest)
+        if cache_key:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                if sink is not None:
+                    sink.write(cached["content"])
+                yield cached["content"]
+                return
+
+        messages, prompt_tokens, budget_error = await self._build_messages(mode, original_prompt, language, output_format, custom_path)
+        if budget_error:
+            yield StreamError(f"\n[Error: {budget_error}]\n")
+            return
 
-        async for chunk in self.llm_client.stream_request(
-            self.api_url, self.api_key, messages, self.model, temperature
-        ):
+        model = self.model
+
+        async def upstream():
+            started = time.monotonic()
+            chunks = []
+            produced = False
+            failed = False
+            async for chunk in self._stream(messages, temperature):
+                if isinstance(chunk, StreamError):
+                    failed = True
+                else:
+                    produced = True
+                    if sink is not None:
+                        sink.write(chunk)
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+
+            # Only complete, error-free generations are worth replaying or keeping
+            if failed or not produced:
+                return
+            content = "".join(chunks) if sink is None else sink.recorded_text()
+            if content is None:
+                logging.info(f"Output in {sink.path} is over {sink.record_limit} characters; not cached or recorded")
+                return
+            self._record_history(mode, custom_path, original_prompt, content, temperature, started, prompt_tokens)
+            if cache_key:
+                await self.cache.put(cache_key, content, {"model": model, "mode": mode})
+
+        if sink is not None:
+            async with contextlib.aclosing(upstream()) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+            return
+
+        # Identical concurrent streams attach to one upstream call; late joiners get the prefix replayed
+        async for chunk in self.flights.stream(self._flight_key(messages, temperature, stream=True), upstream):
             yield chunk
+
+    async def stream_modes(self, modes: list, original_prompt: str, temperature: float, language: str, output_format: str, custom_path: str = None):
+        """
+        Runs several modes at once over the shared LLMClient pool.
+        Yields (mode, chunk) pairs as they arrive from any stream, and a final
+        (mode, None) when that mode's stream has finished. Wall-clock time is
+        roughly that of the slowest mode rather than the sum of all of them.
+        """
+        streams = {
+            mode: (lambda mode=mode: self.stream_prompt(mode, original_prompt, temperature, language, output_format, custom_path))
+            for mode in modes
+        }
+        async for key, chunk in self._merge_streams(streams):
+            yield key, chunk
+
+    async def _merge_streams(self, streams: dict, concurrency: int = None):
+        """
+        Interleaves several streams, given as {key: stream factory}, yielding
+        (key, chunk) as chunks arrive and (key, None) when a stream ends.
+        At most `concurrency` streams run at once (all of them by default).
+        """
+        queue = asyncio.Queue()
+        finished = object()
+        limit = asyncio.Semaphore(concurrency or max(1, len(streams)))
+
+        async def pump(key, factory):
+            try:
+                async with limit:
+                    async for chunk in factory():
+                        await queue.put((key, chunk))
+            except Exception as e:
+                await queue.put((key, StreamError(f"\n[Unexpected Error: {e}]\n")))
+            finally:
+                await queue.put((key, finished))
+
+        tasks = [asyncio.create_task(pump(key, factory)) for key, factory in streams.items()]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                key, chunk = await queue.get()
+                if chunk is finished:
+                    remaining -= 1
+                    yield key, None
+                else:
+                    yield key, chunk
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- Chunked (map-reduce) processing ---
+    def split_prompt(self, original_prompt: str, max_tokens: int) -> list:
+        """
+        Splits a long prompt on headings, then paragraphs, then lines, into
+        chunks of at most `max_tokens` tokens for the current model.
+        """
+        return split_structural(original_prompt, max_tokens, self.model)
+
+    async def stream_chunked(self, mode: str, original_prompt: str, temperature: float, language: str, output_format: str,
+                             custom_path: str = None, max_tokens: int = 1500, concurrency: int = 4,
+                             reduce_template: str = None):
+        """
+        Map-reduce version of stream_prompt for prompts too long to send whole.
+        Map: each chunk from split_prompt goes through the selected template,
+        up to `concurrency` at a time. Yields (index, chunk) and (index, None)
+        per chunk like stream_modes, so callers can show per-chunk progress.
+        Reduce: with `reduce_template`, the map outputs joined in order are run
+        through that template as the original prompt, streamed as ("reduce", chunk)
+        and ("reduce", None). Without it, the ordered map outputs are the result.
+        Each chunk is an ordinary request, so the cache and coalescing apply per chunk.
+        """
+        chunks = self.split_prompt(original_prompt, max_tokens)
+        outputs = [[] for _ in chunks]
+        failed = False
+
+        streams = {
+            index: (lambda chunk=chunk: self.stream_prompt(mode, chunk, temperature, language, output_format, custom_path))
+            for index, chunk in enumerate(chunks)
+        }
+        async for index, chunk in self._merge_streams(streams, concurrency):
+            if isinstance(chunk, StreamError):
+                failed = True
+            elif chunk is not None:
+                outputs[index].append(chunk)
+            yield index, chunk
+
+        if not reduce_template:
+            return
+        if failed:
+            yield "reduce", StreamError("\n[Error: Skipping merge because some chunks failed]\n")
+            yield "reduce", None
+            return
+
+        merged = self.join_chunk_outputs(outputs)
+        async for chunk in self.stream_prompt("custom", merged, temperature, language, output_format, reduce_template):
+            yield "reduce", chunk
+        yield "reduce", None
+
+    @staticmethod
+    def join_chunk_outputs(outputs: list) -> str:
+        """
+        Joins per-chunk outputs (lists of streamed pieces) in input order.
+        """
+        return "\n\n".join("".join(parts).strip() for parts in outputs if parts)
+
+    async def process_chunked(self, mode: str, original_prompt: str, temperature: float, language: str, output_format: str,
+                              custom_path: str = None, max_tokens: int = 1500, concurrency: int = 4,
+                              reduce_template: str = None) -> dict:
+        """
+        Non-streaming counterpart of stream_chunked, shaped like process_prompt's result.
+        """
+        outputs = {}
+        errors = []
+        chunk_count = 0
+        async for index, chunk in self.stream_chunked(mode, original_prompt, temperature, language, output_format,
+                                                      custom_path, max_tokens, concurrency, reduce_template):
+            if isinstance(chunk, StreamError):
+                errors.append(chunk.strip())
+            elif chunk is not None:
+                outputs.setdefault(index, []).append(chunk)
+            elif index != "reduce":
+                chunk_count += 1
+
+        if errors:
+            return {"processed_prompt": f"Error: {errors[0]}", "explanation": "\n".join(errors)}
+        if "reduce" in outputs:
+            content = "".join(outputs["reduce"])
+        else:
+            content = self.join_chunk_outputs([outputs[key] for key in sorted(outputs)])
+        return {
+            "processed_prompt": content,
+            "explanation": f"Processed in {chunk_count} chunks" + (" and merged." if "reduce" in outputs else "."),
+            "meta": {"model": self.model, "mode": mode, "chunks": chunk_count},
+        }
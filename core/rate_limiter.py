@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute` tokens per minute.
+    The level may go negative when usage is corrected upwards after the fact;
+    that debt is then paid off before new requests are admitted.
+    """
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` tokens are available (0 if available now).
+        Requests larger than the bucket only wait for a full bucket.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+
+class RateLimiter:
+    """
+    Async limiter combining a requests-per-minute and a tokens-per-minute bucket.
+    One instance is shared by every caller of an LLMClient; waiters are admitted
+    in FIFO order so sustained throughput sits at the quota instead of bursting.
+    A limit of 0 disables that bucket.
+    """
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.rpm_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tpm_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm_bucket is not None or self.tpm_bucket is not None
+
+    async def acquire(self, tokens: int = 0):
+        if not self.enabled:
+            return
+        if self._lock is None:
+            # Created lazily so it binds to the loop actually running the requests
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                wait = 0.0
+                if self.rpm_bucket:
+                    wait = max(wait, self.rpm_bucket.wait_time(1))
+                if self.tpm_bucket:
+                    wait = max(wait, self.tpm_bucket.wait_time(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self.rpm_bucket:
+                self.rpm_bucket.consume(1)
+            if self.tpm_bucket:
+                self.tpm_bucket.consume(tokens)
+
+    def reconcile(self, estimated: int, actual: int):
+        """
+        Corrects the token bucket once the real usage of a request is known.
+        """
+        if self.tpm_bucket and actual is not None:
+            self.tpm_bucket.adjust(actual - estimated)
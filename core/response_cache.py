@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+def make_cache_key(**fields) -> str:
+    """
+    Builds a stable cache key from keyword fields (prompt, mode, model, ...).
+    """
+    raw = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM results.
+    Tier 1 is an in-memory LRU, tier 2 is a directory of JSON files
+    evicted by age and total size. Disk access runs in the default executor
+    so it never blocks the event loop.
+    """
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = 256,
+                 max_disk_bytes: int = 50 * 1024 * 1024, max_age: float = 7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age = max_age
+        self._memory = OrderedDict()
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError as e:
+                logging.error(f"Response cache disabled on disk: {e}")
+                self.cache_dir = None
+
+    @classmethod
+    def from_config(cls, config_manager):
+        """
+        Builds a cache from ConfigManager settings, or returns None when caching is disabled.
+        """
+        if not config_manager.get_cache_enabled():
+            return None
+        return cls(
+            config_manager.get_cache_dir(),
+            max_entries=config_manager.get_cache_max_entries(),
+            max_disk_bytes=config_manager.get_cache_max_bytes(),
+            max_age=config_manager.get_cache_max_age()
+        )
+
+    # --- Public API ---
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory_get(key)
+        if entry is not None:
+            return entry
+        if not self.cache_dir:
+            return None
+
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(None, self._disk_get, key)
+        if entry is not None:
+            self._memory_put(key, entry)
+        return entry
+
+    async def put(self, key: str, content: str, meta: Optional[Dict[str, Any]] = None):
+        entry = {"content": content, "meta": meta or {}, "created": time.time()}
+        self._memory_put(key, entry)
+        if self.cache_dir:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._disk_put, key, entry)
+
+    def clear(self):
+        self._memory.clear()
+        if not self.cache_dir:
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    # --- Memory tier ---
+    def _is_expired(self, entry) -> bool:
+        return self.max_age > 0 and time.time() - entry.get("created", 0) > self.max_age
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if self._is_expired(entry):
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    def _memory_put(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # --- Disk tier (runs in executor) ---
+    def _path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_get(self, key):
+        path = self._path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.error(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        if self._is_expired(entry):
+            self._remove(path)
+            return None
+        # Touch so size eviction drops least recently used files first
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def _disk_put(self, key, entry):
+        path = self._path_for(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Failed to write cache entry {path}: {e}")
+            self._remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        now = time.time()
+        files = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if self.max_age > 0 and now - st.st_mtime > self.max_age:
+                self._remove(path)
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if self.max_disk_bytes <= 0 or total <= self.max_disk_bytes:
+            return
+        files.sort()  # Oldest access first
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
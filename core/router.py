@@ -0,0 +1,145 @@
+import threading
+import time
+from typing import Dict, List
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.3
+# Score penalty per unit of error rate: an endpoint failing half the time looks 3x slower
+ERROR_PENALTY = 4.0
+# Assumed latency for endpoints without samples yet, so they get tried early
+DEFAULT_LATENCY = 0.5
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible backend plus its live health statistics.
+    Latency and TTFT are exponentially weighted moving averages in seconds;
+    error_rate is an EWMA of 0 (success) / 1 (failure) outcomes.
+    """
+    def __init__(self, url: str, key: str = "", model: str = "", weight: float = 1.0, name: str = None):
+        self.url = url
+        self.key = key
+        self.model = model
+        self.weight = max(float(weight or 0), 0.01)
+        self.name = name or url
+        self.latency = None
+        self.ttft = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = ""
+        self.last_used = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict, defaults: dict = None) -> "Endpoint":
+        defaults = defaults or {}
+        return cls(
+            url=data.get("url") or data.get("api_url") or "",
+            key=data.get("key") or data.get("api_key") or defaults.get("key", ""),
+            model=data.get("model") or defaults.get("model", ""),
+            weight=data.get("weight", 1.0),
+            name=data.get("name")
+        )
+
+    def score(self) -> float:
+        """
+        Expected cost of sending the next request here; lower is better.
+        """
+        latency = self.ttft if self.ttft is not None else self.latency
+        if latency is None:
+            latency = DEFAULT_LATENCY
+        # Requests already queued here will share its capacity
+        return latency * (1 + ERROR_PENALTY * self.error_rate) * (1 + self.in_flight) / self.weight
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "model": self.model,
+            "weight": self.weight,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "ttft_ms": round(self.ttft * 1000, 1) if self.ttft is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+def _ewma(previous, sample: float, alpha: float) -> float:
+    return sample if previous is None else previous + alpha * (sample - previous)
+
+
+class EndpointRouter:
+    """
+    Picks the best endpoint for each request from live latency, time to first
+    token and error rate, skipping endpoints whose circuit breaker is open.
+    `is_available(url)` is supplied by the client that owns the breakers.
+    """
+    def __init__(self, endpoints: List[Endpoint], is_available=None, alpha: float = EWMA_ALPHA):
+        self.endpoints = [e for e in endpoints if e.url]
+        self.is_available = is_available or (lambda url: True)
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config_manager, is_available=None):
+        """
+        Builds a router from the `endpoints` list, or returns None when it is empty
+        and the single api_url/api_key/model should be used instead.
+        """
+        defaults = {"key": config_manager.get_api_key(), "model": config_manager.get_model()}
+        endpoints = [Endpoint.from_dict(e, defaults) for e in config_manager.get_endpoints() if isinstance(e, dict)]
+        endpoints = [e for e in endpoints if e.url]
+        return cls(endpoints, is_available) if endpoints else None
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def candidates(self) -> List[Endpoint]:
+        """
+        Endpoints in the order they should be tried: available ones by score,
+        then those with an open circuit as a last resort.
+        """
+        with self._lock:
+            ranked = sorted(self.endpoints, key=lambda e: (e.score(), e.last_used))
+        available = [e for e in ranked if self.is_available(e.url)]
+        return available + [e for e in ranked if e not in available]
+
+    # --- Recording outcomes ---
+    def start(self, endpoint: Endpoint) -> float:
+        with self._lock:
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            endpoint.last_used = time.monotonic()
+        return time.monotonic()
+
+    def first_token(self, endpoint: Endpoint, started: float):
+        with self._lock:
+            endpoint.ttft = _ewma(endpoint.ttft, time.monotonic() - started, self.alpha)
+
+    def success(self, endpoint: Endpoint, started: float):
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.latency = _ewma(endpoint.latency, time.monotonic() - started, self.alpha)
+            endpoint.error_rate = _ewma(endpoint.error_rate, 0.0, self.alpha)
+
+    def failure(self, endpoint: Endpoint, error: str = ""):
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.failures += 1
+            endpoint.error_rate = _ewma(endpoint.error_rate, 1.0, self.alpha)
+            endpoint.last_error = (error or "").strip()[:200]
+
+    def abandon(self, endpoint: Endpoint):
+        """
+        Ends a call that was cancelled; says nothing about endpoint health.
+        """
+        with self._lock:
+            endpoint.in_flight -= 1
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [dict(e.to_dict(), available=self.is_available(e.url)) for e in self.endpoints]
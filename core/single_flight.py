@@ -0,0 +1,109 @@
+import asyncio
+
+
+class _StreamFlight:
+    """
+    One upstream stream fanned out to any number of subscribers.
+    Every chunk is buffered so late joiners replay the prefix before
+    receiving live chunks.
+    """
+    def __init__(self, agen_factory):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self._changed = asyncio.get_running_loop().create_future()
+        self.task = asyncio.create_task(self._pump(agen_factory))
+
+    async def _pump(self, agen_factory):
+        agen = agen_factory()
+        try:
+            async for chunk in agen:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            await agen.aclose()
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        if not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = asyncio.get_running_loop().create_future()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await asyncio.shield(self._changed)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls onto one upstream call.
+    `do` is for coroutines, `stream` for async generators. Entries are removed
+    as soon as the upstream call finishes, so this never serves stale results;
+    completed results are the ResponseCache's job. The upstream call is
+    cancelled once the last waiter or subscriber goes away.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls or key in self._streams
+
+    async def do(self, key, coro_factory):
+        entry = self._calls.get(key)
+        if entry is None:
+            future = asyncio.ensure_future(coro_factory())
+            entry = [future, 0]
+            self._calls[key] = entry
+            future.add_done_callback(lambda f: self._forget(self._calls, key, entry))
+        future = entry[0]
+
+        entry[1] += 1
+        try:
+            # Shielded so one waiter being cancelled does not cancel everyone else's call
+            return await asyncio.shield(future)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not future.done():
+                # Nobody is waiting any more; stop the upstream call
+                self._forget(self._calls, key, entry)
+                future.cancel()
+
+    async def stream(self, key, agen_factory):
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _StreamFlight(agen_factory)
+            self._streams[key] = flight
+            flight.task.add_done_callback(lambda t: self._forget(self._streams, key, flight))
+
+        flight.subscribers += 1
+        try:
+            async for chunk in flight.subscribe():
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Last subscriber left (cancelled or stopped reading): close the upstream stream
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+
+    @staticmethod
+    def _forget(registry, key, value):
+        if registry.get(key) is value:
+            del registry[key]
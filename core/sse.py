@@ -0,0 +1,183 @@
+import json
+import json.scanner
+
+_scan_once = json.scanner.make_scanner(json.JSONDecoder())
+
+
+def stdlib_loads(data):
+    """
+    json.loads without its per-call overhead (type checks, encoding detection
+    for bytes, whitespace regexes), which costs about as much as parsing a
+    small chunk: the C scanner runs on the payload directly. Anything unusual
+    (surrounding whitespace, trailing data, invalid JSON) goes through
+    json.loads for its exact behaviour and errors.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    try:
+        value, end = _scan_once(data, 0)
+    except StopIteration:
+        return json.loads(data)
+    if end != len(data):
+        return json.loads(data)
+    return value
+
+
+try:
+    # Optional faster JSON backend
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+
+    JSON_BACKEND = "orjson"
+except ImportError:
+    loads = stdlib_loads
+    JSON_BACKEND = "json"
+
+
+class SSEEvent:
+    """
+    A single dispatched Server-Sent Event. `raw` is the payload as received;
+    `data` decodes it on first access. JSON payloads should be parsed from
+    `raw` directly (json.loads and orjson both take UTF-8 bytes), which saves
+    a decode per event.
+    """
+    __slots__ = ("event", "raw", "id", "retry", "_data")
+
+    def __init__(self, raw: bytes, event: str = "message", id: str = None, retry: int = None):
+        self.raw = raw
+        self.event = event
+        self.id = id
+        self.retry = retry
+        self._data = None
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            self._data = self.raw.decode("utf-8", "replace")
+        return self._data
+
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, data={self.data!r}, id={self.id!r})"
+
+
+class SSEDecoder:
+    """
+    Incremental Server-Sent Events decoder working on raw bytes.
+    Follows the WHATWG event-stream rules: CRLF/CR/LF line endings (also when
+    split across reads), multi-line `data` joined with newlines, `event`, `id`
+    and `retry` fields, and comment lines (keep-alives) skipped without parsing.
+    Events are only dispatched on a blank line, so JSON payloads are never
+    parsed half-received.
+    """
+    def __init__(self):
+        self._buffer = b""
+        self._skip_lf = False
+        self._data = []
+        self._event = ""
+        self._id = None
+        self._retry = None
+        self.last_event_id = None
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        Consumes a chunk of bytes and returns the list of completed events.
+        """
+        if self._skip_lf:
+            # Previous read ended with CR; a leading LF belongs to that CRLF
+            self._skip_lf = False
+            if chunk[:1] == b"\n":
+                chunk = chunk[1:]
+        if self._buffer:
+            chunk = self._buffer + chunk
+            self._buffer = b""
+        if not chunk:
+            return []
+
+        if b"\r" in chunk:
+            # Normalise CRLF and lone CR; a trailing CR may be the first half of a CRLF
+            self._skip_lf = chunk[-1:] == b"\r"
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        events = []
+        lines = chunk.split(b"\n")
+        # The last piece is an incomplete line (empty when the chunk ended with a newline)
+        self._buffer = lines.pop()
+
+        data = self._data
+        for line in lines:
+            if line[:5] == b"data:":
+                # Hot path: avoid the generic field parser for payload lines
+                data.append(line[6:] if line[5:6] == b" " else line[5:])
+            elif not line:
+                if data and self._id is None and not self._event and self._retry is None:
+                    # Plain data-only event, the usual case: skip the general dispatch
+                    events.append(SSEEvent(data[0] if len(data) == 1 else b"\n".join(data),
+                                           "message", self.last_event_id))
+                    data = self._data = []
+                elif data or self._id is not None or self._event:
+                    event = self._dispatch()
+                    data = self._data
+                    if event is not None:
+                        events.append(event)
+            elif line[0] != 0x3A:  # ":" starts a comment / keep-alive
+                self._process_field(line)
+        return events
+
+    def close(self) -> list:
+        """
+        Flushes at end of stream. A final event without a trailing blank line
+        is still dispatched, since several providers omit it.
+        """
+        events = []
+        if self._buffer:
+            line, self._buffer = self._buffer, b""
+            if line[0] != 0x3A:
+                self._process_field(line)
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_field(self, line: bytes):
+        name, sep, value = line.partition(b":")
+        if sep and value[:1] == b" ":
+            value = value[1:]
+        if name == b"data":
+            self._data.append(value)
+        elif name == b"event":
+            self._event = value.decode("utf-8", "replace")
+        elif name == b"id":
+            if b"\0" not in value:
+                self._id = value.decode("utf-8", "replace")
+        elif name == b"retry":
+            if value.isdigit():
+                self._retry = int(value)
+        # Unknown fields are ignored per spec
+
+    def _dispatch(self):
+        if self._id is not None:
+            self.last_event_id = self._id
+        if not self._data:
+            self._event = ""
+            self._retry = None
+            return None
+        data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+        event = SSEEvent(data, self._event or "message", self.last_event_id, self._retry)
+        self._data = []
+        self._event = ""
+        self._retry = None
+        return event
+
+
+async def aiter_sse(byte_iterator):
+    """
+    Yields SSEEvents from an async iterator of raw byte chunks (e.g. httpx aiter_bytes()).
+    """
+    decoder = SSEDecoder()
+    async for chunk in byte_iterator:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.close():
+        yield event
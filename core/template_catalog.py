@@ -0,0 +1,260 @@
+import bisect
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from .prompt_loader import PLACEHOLDER_PATTERN, parse_front_matter
+
+try:
+    # Optional: native filesystem events (inotify on Linux, FSEvents, ReadDirectoryChangesW)
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v) for v in value]
+
+
+class TemplateInfo:
+    """
+    Catalog entry for one template file.
+    """
+    __slots__ = ("name", "path", "title", "description", "tags", "placeholders", "mtime_ns", "size")
+
+    def __init__(self, name: str, path: str, meta: dict, body: str, mtime_ns: int, size: int):
+        self.name = name
+        self.path = path
+        self.title = str(meta.get("title") or "")
+        self.description = str(meta.get("description") or "")
+        self.tags = sorted({t.lower() for t in _as_list(meta.get("tags"))})
+        # Declared placeholders win; otherwise whatever the body actually uses
+        declared = meta.get("placeholders", meta.get("required"))
+        if declared is not None:
+            self.placeholders = _as_list(declared)
+        else:
+            self.placeholders = list(dict.fromkeys(PLACEHOLDER_PATTERN.findall(body)))
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "title": self.title,
+            "description": self.description,
+            "tags": list(self.tags),
+            "placeholders": list(self.placeholders),
+        }
+
+
+class _WatchHandler(FileSystemEventHandler):
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            # Folder created/moved/deleted: let the incremental rescan sort it out
+            if event.event_type != "modified":
+                self.catalog.scan()
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path:
+                self.catalog.refresh_path(path)
+
+
+class TemplateCatalog:
+    """
+    In-memory index of every template under `root`, including nested folders.
+    Built by one scan and then kept current by a filesystem watcher (watchdog
+    when installed, otherwise a polling thread that only re-reads files whose
+    mtime or size changed). Lookups never touch the disk.
+    """
+    def __init__(self, root: str, extensions=(".md",), poll_interval: float = 2.0):
+        self.root = os.path.abspath(root)
+        self.extensions = tuple(extensions)
+        self.poll_interval = poll_interval
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._index = None
+        self._observer = None
+        self._poller = None
+        self._stop = threading.Event()
+        self.version = 0
+
+    # --- Building and updating ---
+    def scan(self):
+        """
+        Walks the tree and re-parses only new or changed files. Safe to call repeatedly.
+        """
+        seen = {}
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.endswith(self.extensions):
+                            try:
+                                seen[os.path.abspath(entry.path)] = entry.stat()
+                            except OSError:
+                                continue
+            except OSError as e:
+                if directory == self.root:
+                    logging.error(f"Error scanning for templates: {e}")
+
+        with self._lock:
+            changed = False
+            for path in list(self._entries):
+                if path not in seen:
+                    del self._entries[path]
+                    changed = True
+            for path, st in seen.items():
+                info = self._entries.get(path)
+                if info and info.mtime_ns == st.st_mtime_ns and info.size == st.st_size:
+                    continue
+                info = self._parse(path, st)
+                if info is not None:
+                    self._entries[path] = info
+                    changed = True
+            if changed:
+                self._changed()
+
+    def refresh_path(self, path: str):
+        """
+        Updates the entry for one file after a create/modify/delete/move event.
+        """
+        path = os.path.abspath(path)
+        if not path.endswith(self.extensions) or not path.startswith(self.root + os.sep):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                if self._entries.pop(path, None) is not None:
+                    self._changed()
+            return
+        with self._lock:
+            info = self._entries.get(path)
+            if info and info.mtime_ns == st.st_mtime_ns and info.size == st.st_size:
+                return
+        info = self._parse(path, st)
+        if info is not None:
+            with self._lock:
+                self._entries[path] = info
+                self._changed()
+
+    def _parse(self, path: str, st) -> Optional[TemplateInfo]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logging.warning(f"Skipping unreadable template {path}: {e}")
+            return None
+        meta, body = parse_front_matter(text)
+        name = os.path.relpath(path, self.root).replace(os.sep, "/")
+        return TemplateInfo(name, path, meta, body, st.st_mtime_ns, st.st_size)
+
+    def _changed(self):
+        self._index = None
+        self.version += 1
+
+    # --- Watching ---
+    def start_watching(self):
+        if self._observer or self._poller:
+            return
+        if Observer is not None:
+            try:
+                observer = Observer()
+                observer.schedule(_WatchHandler(self), self.root, recursive=True)
+                observer.daemon = True
+                observer.start()
+                self._observer = observer
+                return
+            except OSError as e:
+                # e.g. inotify watch limit reached
+                logging.warning(f"Filesystem watcher unavailable, polling templates instead: {e}")
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, name="template-catalog-poller", daemon=True)
+        self._poller.start()
+
+    def stop_watching(self):
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._poller:
+            self._stop.set()
+            self._poller.join()
+            self._poller = None
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.scan()
+            except Exception as e:
+                logging.error(f"Template poll failed: {e}")
+
+    # --- Queries ---
+    def _get_index(self):
+        with self._lock:
+            if self._index is None:
+                entries = sorted(self._entries.values(), key=lambda i: i.name.lower())
+                keys = []
+                by_tag = {}
+                for info in entries:
+                    # Prefix keys: relative path, file name and title
+                    keys.append((info.name.lower(), info.path))
+                    if "/" in info.name:
+                        keys.append((info.name.rsplit("/", 1)[1].lower(), info.path))
+                    if info.title:
+                        keys.append((info.title.lower(), info.path))
+                    for tag in info.tags:
+                        by_tag.setdefault(tag, []).append(info)
+                keys.sort()
+                self._index = (entries, keys, by_tag)
+            return self._index
+
+    def list(self) -> List[TemplateInfo]:
+        return list(self._get_index()[0])
+
+    def get(self, path: str) -> Optional[TemplateInfo]:
+        return self._entries.get(os.path.abspath(path))
+
+    def tags(self) -> List[str]:
+        return sorted(self._get_index()[2])
+
+    def find(self, prefix: str = None, tag: str = None) -> List[TemplateInfo]:
+        """
+        Templates whose relative path, file name or title starts with `prefix`
+        (case-insensitive) and/or that carry `tag`, ordered by name.
+        """
+        entries, keys, by_tag = self._get_index()
+        if prefix:
+            prefix = prefix.lower()
+            paths = set()
+            i = bisect.bisect_left(keys, (prefix,))
+            while i < len(keys) and keys[i][0].startswith(prefix):
+                paths.add(keys[i][1])
+                i += 1
+            candidates = [info for info in entries if info.path in paths]
+        else:
+            candidates = entries
+        if tag:
+            tagged = {id(info) for info in by_tag.get(tag.lower(), ())}
+            candidates = [info for info in candidates if id(info) in tagged]
+        return list(candidates)
+
+    def __len__(self):
+        return len(self._entries)
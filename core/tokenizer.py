@@ -0,0 +1,200 @@
+import logging
+import threading
+
+# Message framing overhead per chat message and for the reply priming
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+BUDGET_ACTIONS = ("warn", "truncate", "refuse")
+
+
+def utf8_extra(text: str) -> int:
+    return 0 if text.isascii() else len(text.encode("utf-8", "surrogatepass")) - len(text)
+
+
+class HeuristicTokenizer:
+    """
+    Dependency-free estimate tuned for BPE vocabularies: about 4 characters per
+    token for ASCII text and about one token per CJK character. Works on
+    encoded lengths only, so it is cheap enough to run on every keystroke.
+    """
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return self.count_lengths(len(text), utf8_extra(text))
+
+    @staticmethod
+    def count_lengths(chars: int, extra: int) -> int:
+        """
+        The estimate from a character count and the UTF-8 bytes beyond one per
+        character; each non-ASCII code point adds 1-3 (CJK adds 2).
+        """
+        wide = (extra + 1) // 2
+        return (chars - wide + 3) // 4 + wide
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        # Longest prefix within budget; count() is monotonic in prefix length
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo]
+
+
+class TiktokenTokenizer:
+    """
+    Exact counts for OpenAI-family models via the optional `tiktoken` package.
+    """
+    def __init__(self, model: str):
+        import tiktoken
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.name = f"tiktoken:{self.encoding.name}"
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=())) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+
+# Model-name prefix -> tokenizer factory. Checked longest prefix first.
+_FACTORIES = {
+    "gpt-": TiktokenTokenizer,
+    "o1": TiktokenTokenizer,
+    "o3": TiktokenTokenizer,
+    "o4": TiktokenTokenizer,
+    "text-embedding-": TiktokenTokenizer,
+}
+_instances = {}
+_instances_lock = threading.Lock()
+_heuristic = HeuristicTokenizer()
+
+
+def register_tokenizer(model_prefix: str, factory):
+    """
+    Plugs in an exact tokenizer for models whose name starts with `model_prefix`.
+    `factory(model)` must return an object with count(text) and truncate(text, max_tokens);
+    raising ImportError makes those models fall back to the heuristic.
+    """
+    with _instances_lock:
+        _FACTORIES[model_prefix] = factory
+        _instances.clear()
+
+
+def get_tokenizer(model: str = None):
+    """
+    Best available tokenizer for `model`, cached per model name.
+    """
+    model = model or ""
+    tokenizer = _instances.get(model)
+    if tokenizer is not None:
+        return tokenizer
+    with _instances_lock:
+        tokenizer = _instances.get(model)
+        if tokenizer is None:
+            tokenizer = _heuristic
+            for prefix in sorted(_FACTORIES, key=len, reverse=True):
+                if model.startswith(prefix):
+                    try:
+                        tokenizer = _FACTORIES[prefix](model)
+                    except ImportError:
+                        pass
+                    except Exception as e:
+                        logging.warning(f"Tokenizer for {model} unavailable, estimating instead: {e}")
+                    break
+            _instances[model] = tokenizer
+    return tokenizer
+
+
+def count_message_tokens(messages: list, tokenizer=None) -> int:
+    tokenizer = tokenizer or _heuristic
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + tokenizer.count(message.get("content") or "")
+    return total
+
+
+class StreamTokenCounter:
+    """
+    Token count of text that arrives in pieces, without keeping the text.
+    Exact tokenizers count each piece (providers stream about a token per
+    chunk); the heuristic tallies lengths and estimates once from the totals,
+    so it matches counting the joined text.
+    """
+    __slots__ = ("tokenizer", "chars", "extra", "tokens")
+
+    def __init__(self, tokenizer=None):
+        self.tokenizer = tokenizer or _heuristic
+        self.chars = 0
+        self.extra = 0
+        self.tokens = 0
+
+    def add(self, text: str):
+        if isinstance(self.tokenizer, HeuristicTokenizer):
+            self.chars += len(text)
+            self.extra += utf8_extra(text)
+        else:
+            self.tokens += self.tokenizer.count(text)
+
+    @property
+    def total(self) -> int:
+        if isinstance(self.tokenizer, HeuristicTokenizer):
+            return self.tokenizer.count_lengths(self.chars, self.extra)
+        return self.tokens
+
+
+class TokenBudget:
+    """
+    Per-model prompt budgets. `budgets` maps a model name (or prefix, or
+    "default") to a max prompt token count, optionally with its own action:
+    {"gpt-4o": 120000, "default": {"max_tokens": 8000, "action": "refuse"}}.
+    Actions: warn (send anyway), truncate (shorten the original prompt to fit)
+    or refuse (do not send).
+    """
+    def __init__(self, budgets: dict = None, action: str = "warn"):
+        self.action = action if action in BUDGET_ACTIONS else "warn"
+        self.budgets = {}
+        for model, value in (budgets or {}).items():
+            if isinstance(value, dict):
+                max_tokens = int(value.get("max_tokens") or 0)
+                model_action = value.get("action", self.action)
+            else:
+                max_tokens = int(value or 0)
+                model_action = self.action
+            if max_tokens > 0:
+                self.budgets[model] = (max_tokens, model_action if model_action in BUDGET_ACTIONS else self.action)
+
+    @classmethod
+    def from_config(cls, config_manager):
+        return cls(config_manager.get_token_budgets(), config_manager.get_token_budget_action())
+
+    def limit_for(self, model: str):
+        """
+        Returns (max_tokens, action) for `model`, or None when it is unbudgeted.
+        Exact names win over the longest matching prefix, which wins over "default".
+        """
+        model = model or ""
+        if model in self.budgets:
+            return self.budgets[model]
+        prefixes = [p for p in self.budgets if p != "default" and model.startswith(p)]
+        if prefixes:
+            return self.budgets[max(prefixes, key=len)]
+        return self.budgets.get("default")
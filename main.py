@@ -1,67 +1,223 @@
+import asyncio
+import logging
 import flet as ft
 from core.config_manager import ConfigManager
-from core.llm_client import LLMClient
+from core.metrics import METRICS
+from core.output_sink import OutputSink, prune_spool, spool_path
 from core.prompt_processor import PromptProcessor
+from core.router import EndpointRouter
 from ui.main_window import AppViews
+from ui.stream_renderer import SectionedRenderer, StreamRenderer, TailRenderer
 
 def main(page: ft.Page):
     page.title = "Ning_Prompt"
     
     # Core Logic
-    config_manager = ConfigManager("config.json")
+    # Settings saves are applied in memory at once and written to disk in the background
+    config_manager = ConfigManager("config.json", flush_delay=0.5)
     
     # Initialize Theme
     saved_theme = config_manager.get_theme_mode()
     page.theme_mode = ft.ThemeMode.DARK if saved_theme == "dark" else ft.ThemeMode.LIGHT
     
-    llm_client = LLMClient()
-    processor = PromptProcessor(llm_client, config_manager.get_api_url(), config_manager.get_api_key(), config_manager.get_model())
+    processor = PromptProcessor.from_config(config_manager)
+    llm_client = processor.llm_client
 
-    async def run_prompt_process(original_prompt, mode, temperature, view_instance, custom_path=None):
+    # Per-run settings, kept current by change notifications instead of re-read on every run
+    run_settings = {
+        "response_language": config_manager.get_response_language(),
+        "output_format": config_manager.get_output_format(),
+        "render_fps": config_manager.get_render_fps(),
+        "chunk_max_tokens": config_manager.get_chunk_max_tokens(),
+        "chunk_concurrency": config_manager.get_chunk_concurrency(),
+        "chunk_reduce_template": config_manager.get_chunk_reduce_template(),
+        "output_spool_enabled": config_manager.get_output_spool_enabled(),
+        "output_spool_dir": config_manager.get_output_spool_dir(),
+        "output_spool_keep": config_manager.get_output_spool_keep(),
+        "output_fsync": config_manager.get_output_fsync(),
+        "output_fsync_interval": config_manager.get_output_fsync_interval(),
+        "output_window_pages": config_manager.get_output_window_pages(),
+        "output_record_max_chars": config_manager.get_output_record_max_chars(),
+    }
+
+    def on_config_change(changes):
         # Update processor with latest config
         processor.api_url = config_manager.get_api_url()
         processor.api_key = config_manager.get_api_key()
         processor.model = config_manager.get_model()
-        
-        # Get extra params from config
-        lang = config_manager.get_response_language()
-        output_format = config_manager.get_output_format()
+        if changes.keys() & {"endpoints", "api_key", "model"}:
+            llm_client.router = EndpointRouter.from_config(config_manager, llm_client.endpoint_available)
+        run_settings.update({key: value for key, value in changes.items() if key in run_settings})
+        if "api_url" in changes or "endpoints" in changes:
+            prewarm_connection()
+        if changes.keys() & {"metrics_enabled", "metrics_file", "metrics_export_interval"}:
+            METRICS.configure_from(config_manager)
+
+    config_manager.subscribe(on_config_change, keys=("api_url", "api_key", "model", "endpoints",
+                                                  "metrics_enabled", "metrics_file", "metrics_export_interval", *run_settings))
+
+    async def run_prompt_process(original_prompt, mode, temperature, view_instance, custom_path=None):
+        lang = run_settings["response_language"]
+        output_format = run_settings["output_format"]
 
-        if not processor.api_url or not processor.api_key or not original_prompt:
+        if not processor.is_configured() or not original_prompt:
             view_instance.output_text.value = "Error: Please configure API Settings and enter a prompt."
             view_instance.page.update()
             return
 
+        if view_instance.chunk_switch.value:
+            chunks = processor.split_prompt(original_prompt, run_settings["chunk_max_tokens"])
+            if len(chunks) > 1:
+                await run_chunked_process(original_prompt, len(chunks), mode, temperature, view_instance, custom_path)
+                return
+
+        # Spool the output to disk and keep only a window of it on screen, so long answers use flat memory
+        sink = open_spool()
+        if sink:
+            renderer = TailRenderer(view_instance.output_text, sink, max_fps=run_settings["render_fps"],
+                                    max_pages=run_settings["output_window_pages"])
+            view_instance.output_window = renderer
+        else:
+            renderer = StreamRenderer(view_instance.output_text, max_fps=run_settings["render_fps"])
         try:
             view_instance.output_text.value = "" # Clear previous output
-            current_text = ""
             
-            # Use streaming
-            async for chunk in processor.stream_prompt(mode, original_prompt, temperature, lang, output_format, custom_path):
-                current_text += chunk
-                view_instance.output_text.value = current_text
-                # Update page periodically or on every chunk? 
-                # Flet handles updates pretty well, but for very long streams, 
-                # maybe verify if we need throttling. For now, direct update.
-                view_instance.page.update()
+            # Use streaming; the renderer coalesces chunks into capped-rate frames
+            with METRICS.span("generation_seconds"):
+                async for chunk in processor.stream_prompt(mode, original_prompt, temperature, lang, output_format,
+                                                           custom_path, sink=sink):
+                    renderer.feed(chunk)
+
+                # Final touch
+                renderer.close("\n\n--- End of Generation ---")
+            METRICS.inc("generations_total")
             
-            # Final touch
-            view_instance.output_text.value += "\n\n--- End of Generation ---"
+        except asyncio.CancelledError:
+            # Stopped, superseded by a new run, or navigated away; the HTTP stream is already closed
+            renderer.close("\n\n--- Generation Stopped ---")
+            raise
+        except Exception as ex:
+            renderer.close()
+            view_instance.output_window = None
+            view_instance.output_text.value = f"Critical Error: {ex}"
+            view_instance.page.update()
+        finally:
+            if sink:
+                sink.close()
+                page.run_thread(prune_spool, run_settings["output_spool_dir"], run_settings["output_spool_keep"], sink.path)
+
+    def open_spool():
+        if not run_settings["output_spool_enabled"]:
+            return None
+        try:
+            return OutputSink(spool_path(run_settings["output_spool_dir"]), fsync=run_settings["output_fsync"],
+                              fsync_interval=run_settings["output_fsync_interval"],
+                              record_limit=run_settings["output_record_max_chars"])
+        except OSError as e:
+            logging.error(f"Output spooling disabled for this run: {e}")
+            return None
+
+    async def run_chunked_process(original_prompt, total, mode, temperature, view_instance, custom_path=None):
+        # Map-reduce: chunks stream concurrently into their own sections under a progress header
+        output = view_instance.output_text
+        reduce_template = run_settings["chunk_reduce_template"] or None
+        renderer = SectionedRenderer(output, total, max_fps=run_settings["render_fps"])
+        reduce_renderer = None
+        done = 0
+        try:
+            output.value = ""
+            renderer.set_header(f"*Chunks: 0/{total} done*")
+            async for index, chunk in processor.stream_chunked(
+                mode, original_prompt, temperature, run_settings["response_language"], run_settings["output_format"],
+                custom_path, run_settings["chunk_max_tokens"], run_settings["chunk_concurrency"], reduce_template
+            ):
+                if index == "reduce":
+                    if reduce_renderer is None:
+                        # The merged result replaces the per-chunk drafts
+                        renderer.close()
+                        renderer = reduce_renderer = StreamRenderer(output, max_fps=run_settings["render_fps"])
+                    if chunk is not None:
+                        reduce_renderer.feed(chunk)
+                elif chunk is None:
+                    done += 1
+                    merging = " — merging..." if reduce_template and done == total else ""
+                    renderer.set_header(f"*Chunks: {done}/{total} done{merging}*")
+                else:
+                    renderer.feed_section(index, chunk)
+
+            renderer.close("\n\n--- End of Generation ---")
+
+        except asyncio.CancelledError:
+            renderer.close("\n\n--- Generation Stopped ---")
+            raise
+        except Exception as ex:
+            renderer.close()
+            output.value = f"Critical Error: {ex}"
+            view_instance.page.update()
+
+    async def run_all_modes_process(original_prompt, modes, temperature, view_instance):
+        lang = run_settings["response_language"]
+        output_format = run_settings["output_format"]
+        panes = view_instance.compare_outputs
+
+        if not processor.is_configured() or not original_prompt:
+            for mode in modes:
+                panes[mode].value = "Error: Please configure API Settings and enter a prompt."
             view_instance.page.update()
+            return
+
+        # One renderer per pane; all modes stream concurrently over the shared client pool
+        renderers = {mode: StreamRenderer(panes[mode], max_fps=run_settings["render_fps"]) for mode in modes}
+        finished = set()
+        try:
+            for mode in modes:
+                panes[mode].value = ""
             
+            async for mode, chunk in processor.stream_modes(modes, original_prompt, temperature, lang, output_format):
+                if chunk is None:
+                    finished.add(mode)
+                    renderers[mode].close("\n\n--- End of Generation ---")
+                else:
+                    renderers[mode].feed(chunk)
+            
+        except asyncio.CancelledError:
+            for mode in modes:
+                if mode not in finished:
+                    renderers[mode].close("\n\n--- Generation Stopped ---")
+            raise
         except Exception as ex:
-            view_instance.output_text.value = f"Critical Error: {ex}"
+            for mode in modes:
+                renderers[mode].close()
+                panes[mode].value = f"Critical Error: {ex}"
             view_instance.page.update()
 
+    def prewarm_connection():
+        # Open a pooled connection so the first generation skips DNS/TCP/TLS setup
+        if not config_manager.get_prewarm_enabled():
+            return
+        urls = [e.url for e in llm_client.router.endpoints] if llm_client.router else [config_manager.get_api_url()]
+        for url in filter(None, urls):
+            page.run_task(llm_client.prewarm, url)
+
+    # Build the template catalog in the background so custom mode opens instantly
+    page.run_thread(lambda: processor.loader.catalog)
+
     # Navigation Logic
-    app_views = AppViews(page, config_manager, processor, run_prompt_process)
+    app_views = AppViews(page, config_manager, processor, run_prompt_process, on_run_all_callback=run_all_modes_process)
+    prewarm_connection()
 
     def route_change(route):
-        page.views.clear()
-        if page.route == "/":
-            page.views.append(app_views.get_main_view())
-        elif page.route == "/settings":
-            page.views.append(app_views.get_settings_view())
+        if page.route != "/":
+            # Leaving the main view stops any running generation
+            app_views.cancel_generation()
+        # Views are cached and the main view stays mounted underneath the others,
+        # so navigating only sends the view being pushed or popped
+        stack = [app_views.get_main_view()]
+        if page.route == "/settings":
+            stack.append(app_views.get_settings_view())
+        elif page.route == "/history":
+            stack.append(app_views.get_history_view())
+        page.views[:] = stack
         page.update()
 
     def view_pop(view):
@@ -69,8 +225,19 @@ def main(page: ft.Page):
         top_view = page.views[-1]
         page.go(top_view.route)
 
+    def on_disconnect(e):
+        # Commit queued history entries while the session is away
+        if processor.history:
+            processor.history.flush()
+
+    def on_close(e):
+        if processor.history:
+            processor.history.close()
+
     page.on_route_change = route_change
     page.on_view_pop = view_pop
+    page.on_disconnect = on_disconnect
+    page.on_close = on_close
     
     # Start at home
     page.go("/")
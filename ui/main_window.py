@@ -1,12 +1,17 @@
+import asyncio
 import flet as ft
 import time
 import threading
+from core.prompt_processor import BUILTIN_MODES
+from core.metrics import METRICS
+from ui.markdown_stream import MarkdownStream
 
 TRANSLATIONS = {
     "en": {
         "app_title": "Prompt Workshop",
         "input_label": "INPUT",
         "input_placeholder": "Type your prompt here...",
+        "tokens": "tokens",
         "select_mode": "MODE",
         "mode_enhance": "Enhance",
         "mode_generalize": "Generalize",
@@ -14,7 +19,10 @@ TRANSLATIONS = {
         "mode_pruning": "Pruning",
         "mode_custom": "Custom Template",
         "select_template": "Select Template",
+        "compare_modes": "Compare All Modes",
+        "chunk_long": "Split Long Prompts",
         "process_btn": "GENERATE",
+        "stop_btn": "Stop",
         "temperature": "CREATIVITY (Temperature)",
         "output_label": "OUTPUT",
         "copy_btn": "Copy",
@@ -32,11 +40,15 @@ TRANSLATIONS = {
         "theme": "Dark Mode",
         "save_return": "Save & Return",
         "processing": "Processing...",
+        "history_title": "History",
+        "history_search": "Search prompts and results...",
+        "history_empty": "No generations yet.",
     },
     "zh": {
         "app_title": "提示词工坊",
         "input_label": "输入区域",
         "input_placeholder": "在此输入您的原始提示词...",
+        "tokens": "tokens",
         "select_mode": "处理模式",
         "mode_enhance": "语义增强",
         "mode_generalize": "语义泛化",
@@ -44,7 +56,10 @@ TRANSLATIONS = {
         "mode_pruning": "语义剪枝",
         "mode_custom": "自定义模板",
         "select_template": "选择模板文件",
+        "compare_modes": "全模式对比",
+        "chunk_long": "长提示词分块处理",
         "process_btn": "立即生成",
+        "stop_btn": "停止生成",
         "temperature": "创造性 (温度)",
         "output_label": "输出结果",
         "copy_btn": "复制",
@@ -62,6 +77,9 @@ TRANSLATIONS = {
         "theme": "深色模式",
         "save_return": "保存并返回",
         "processing": "正在处理中...",
+        "history_title": "历史记录",
+        "history_search": "搜索提示词与结果...",
+        "history_empty": "暂无生成记录。",
     }
 }
 
@@ -72,14 +90,39 @@ NEU_BG_DARK = "#2b2e33"
 ACCENT_CYAN = "#00e5ff"
 ACCENT_GRADIENT = ["#00e5ff", "#00b8d4"]
 
+# (light, dark) pairs for themed properties
+BG_COLORS = (NEU_BG_LIGHT, NEU_BG_DARK)
+TEXT_COLORS = ("#4a5568", "white")
+MUTED_TEXT_COLORS = (ft.colors.with_opacity(0.5, "#4a5568"), ft.colors.with_opacity(0.5, "white"))
+DIVIDER_COLORS = (ft.colors.with_opacity(0.1, "#4a5568"), ft.colors.with_opacity(0.1, "white"))
+
+# Seconds between stats strip refreshes while a generation runs
+STATS_REFRESH_INTERVAL = 1.0
+
 class AppViews:
-    def __init__(self, page: ft.Page, config_manager, processor, on_run_callback):
+    def __init__(self, page: ft.Page, config_manager, processor, on_run_callback, on_run_all_callback=None):
         self.page = page
         self.config_manager = config_manager
         self.processor = processor
         self.on_run_callback = on_run_callback
+        self.on_run_all_callback = on_run_all_callback
         
         self.lang = self.config_manager.get_language()
+        self._generation = None  # Task of the generation currently streaming, if any
+        self.output_window = None  # TailRenderer when output_text shows a window of a spooled output
+        # Views are built once; these registries let theme and language changes patch them in place
+        self._views = {}
+        self._themed_controls = []
+        self._translated_controls = []
+        # History paging state: keyset cursor plus a token that invalidates stale searches
+        self._history_last_id = None
+        self._history_exhausted = False
+        self._history_loading = False
+        # Bumped on every reload; pages requested for an older list are dropped
+        self._history_generation = 0
+        self._history_search_token = 0
+        # Bumped per token count request so only the last one while typing runs
+        self._token_count_token = 0
         
         # State
         self._init_components()
@@ -96,8 +139,12 @@ class AppViews:
             border=ft.InputBorder.NONE, 
             text_size=14,
             cursor_color=ACCENT_CYAN,
+            on_change=lambda _: self._update_token_count(),
         )
 
+        # 1.1 Live token count of template + prompt against the model's budget
+        self.token_count_text = ft.Text("", size=11)
+
         # 2. Mode Dropdown
         self.mode_dropdown = ft.Dropdown(
             options=[
@@ -130,6 +177,25 @@ class AppViews:
             height=45,
             content_padding=10,
             color=ACCENT_CYAN,
+            on_change=lambda _: self._update_token_count(),
+        )
+
+        # 2.2 Compare Switch: run every built-in mode at once
+        self.compare_switch = ft.Switch(
+            label=self.T("compare_modes"),
+            value=False,
+            active_color=ACCENT_CYAN,
+            label_style=ft.TextStyle(size=12),
+            on_change=self._on_compare_change,
+            visible=self.on_run_all_callback is not None,
+        )
+
+        # 2.3 Chunk Switch: map-reduce prompts longer than chunk_max_tokens
+        self.chunk_switch = ft.Switch(
+            label=self.T("chunk_long"),
+            value=False,
+            active_color=ACCENT_CYAN,
+            label_style=ft.TextStyle(size=12),
         )
 
         # 3. Slider (Temperature)
@@ -141,14 +207,28 @@ class AppViews:
             thumb_color=ACCENT_CYAN,
         )
         
-        # 4. Output Text
-        self.output_text = ft.Markdown(
+        # 4. Output Text (appends finished Markdown blocks instead of re-rendering everything per chunk)
+        self.output_text = MarkdownStream(
             value=self.T("output_placeholder"), 
             selectable=True,
             extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
             code_theme="atom-one-dark",
         )
         
+        # 4.1 Live latency/throughput strip, shown while metrics are enabled
+        self.stats_text = ft.Text("", size=11, color=ft.colors.with_opacity(0.5, ACCENT_CYAN), visible=False)
+
+        # 4.2 Per-mode output panes for compare mode
+        self.compare_outputs = {
+            mode: MarkdownStream(
+                value=self.T("output_placeholder"),
+                selectable=True,
+                extension_set=ft.MarkdownExtensionSet.GITHUB_WEB,
+                code_theme="atom-one-dark",
+            )
+            for mode in BUILTIN_MODES
+        }
+        
         # 5. Copy Button & Output Header
         self.copy_btn = ft.IconButton(
             icon=ft.icons.COPY,
@@ -170,6 +250,15 @@ class AppViews:
             on_hover=self._on_btn_hover,
             ink=True,
         )
+
+        # 6.1 Stop Button (only shown while a generation is running)
+        self.stop_btn = ft.TextButton(
+            text=self.T("stop_btn"),
+            icon=ft.icons.STOP_CIRCLE_OUTLINED,
+            icon_color=ft.colors.RED_400,
+            visible=False,
+            on_click=lambda _: self.cancel_generation(),
+        )
         
         # Settings inputs (same as before)
         self.api_url_field = ft.TextField(label=self.T("api_url"), value=self.config_manager.get_api_url(), border_color=ACCENT_CYAN)
@@ -200,7 +289,24 @@ class AppViews:
 
         self.theme_switch = ft.Switch(label=self.T("theme"), value=(self.config_manager.get_theme_mode() == "dark"), on_change=self._on_theme_change, active_color=ACCENT_CYAN)
 
+        # --- History Components ---
+        self.history_search = ft.TextField(
+            hint_text=self.T("history_search"),
+            prefix_icon=ft.icons.SEARCH,
+            border_color=ACCENT_CYAN,
+            on_change=self._on_history_search,
+        )
+        # Pages are appended as the list nears its end
+        self.history_list = ft.ListView(expand=True, spacing=8, on_scroll_interval=100, on_scroll=self._on_history_scroll)
+
     def _refresh_ui_text(self):
+        """
+        Re-labels every control in place for the current language; cached views
+        are not rebuilt, so Flet only sends the changed properties.
+        """
+        for control, attr, key, upper in self._translated_controls:
+            text = self.T(key)
+            setattr(control, attr, text.upper() if upper else text)
         self.prompt_field.hint_text = self.T("input_placeholder")
         self.mode_dropdown.options = [
             ft.dropdown.Option("enhance", self.T("mode_enhance")),
@@ -210,8 +316,15 @@ class AppViews:
             ft.dropdown.Option("custom", self.T("mode_custom")),
         ]
         self.file_dropdown.label = self.T("select_template")
+        self.compare_switch.label = self.T("compare_modes")
+        self.chunk_switch.label = self.T("chunk_long")
+        # Only placeholders are replaced; generated output is kept
+        placeholders = {TRANSLATIONS[lang]["output_placeholder"] for lang in TRANSLATIONS}
+        for pane in [self.output_text, *self.compare_outputs.values()]:
+            if pane.value in placeholders:
+                pane.value = self.T("output_placeholder")
         self.run_btn.content.value = self.T("process_btn")
-        self.output_text.value = self.T("output_placeholder")
+        self.stop_btn.text = self.T("stop_btn")
         self.copy_btn.tooltip = self.T("copy_btn")
         self.api_url_field.label = self.T("api_url")
         self.api_key_field.label = self.T("api_key")
@@ -220,44 +333,118 @@ class AppViews:
         self.resp_lang_dropdown.label = self.T("response_lang")
         self.fmt_dropdown.label = self.T("output_fmt")
         self.theme_switch.label = self.T("theme")
+        self.history_search.hint_text = self.T("history_search")
+        self._update_token_count()
         self.page.update()
 
-    def _neu_container(self, content, is_dark, recessed=False):
-        bg_color = NEU_BG_DARK if is_dark else NEU_BG_LIGHT
-        shadow_light = ft.colors.with_opacity(0.1, "white") if is_dark else "white"
-        shadow_dark = ft.colors.with_opacity(0.5, "black") if is_dark else ft.colors.with_opacity(0.2, "#a3b1c6")
-        
+    def apply_theme(self):
+        """
+        Restyles every themed control in place for page.theme_mode.
+        """
+        dark = self._is_dark()
+        for control, colors in self._themed_controls:
+            for name, pair in colors.items():
+                setattr(control, name, pair[dark])
+        self.page.bgcolor = BG_COLORS[dark]
+        self.page.update()
+
+    # --- View building helpers ---
+    def _is_dark(self) -> bool:
+        return self.page.theme_mode == ft.ThemeMode.DARK
+
+    def _themed(self, control, **colors):
+        """
+        Sets properties from (light, dark) pairs and remembers them for apply_theme.
+        """
+        dark = self._is_dark()
+        for name, pair in colors.items():
+            setattr(control, name, pair[dark])
+        self._themed_controls.append((control, colors))
+        return control
+
+    def _translated(self, control, attr, key, upper=False):
+        """
+        Sets a translated property and remembers it for _refresh_ui_text.
+        """
+        text = self.T(key)
+        setattr(control, attr, text.upper() if upper else text)
+        self._translated_controls.append((control, attr, key, upper))
+        return control
+
+    def _text(self, key, upper=False, colors=None, **kwargs):
+        control = self._translated(ft.Text(**kwargs), "value", key, upper)
+        return self._themed(control, color=colors) if colors else control
+
+    def _cached_view(self, route, build):
+        # Views are built once and then kept; navigation only swaps them in and out
+        view = self._views.get(route)
+        if view is None:
+            view = self._views[route] = self._themed(build(), bgcolor=BG_COLORS)
+        return view
+
+    def _neu_container(self, content, recessed=False):
         if recessed:
-            return ft.Container(
-                content=content,
-                bgcolor=bg_color,
-                border_radius=20,
-                padding=20,
-                shadow=ft.BoxShadow(spread_radius=1, blur_radius=15, color=shadow_dark, offset=ft.Offset(5, 5), blur_style=ft.ShadowBlurStyle.INNER),
-                border=ft.border.all(1, ft.colors.with_opacity(0.05, "white")) if is_dark else None
+            container = ft.Container(content=content, border_radius=20, padding=20)
+            return self._themed(
+                container,
+                bgcolor=BG_COLORS,
+                shadow=(
+                    ft.BoxShadow(spread_radius=1, blur_radius=15, color=ft.colors.with_opacity(0.2, "#a3b1c6"), offset=ft.Offset(5, 5), blur_style=ft.ShadowBlurStyle.INNER),
+                    ft.BoxShadow(spread_radius=1, blur_radius=15, color=ft.colors.with_opacity(0.5, "black"), offset=ft.Offset(5, 5), blur_style=ft.ShadowBlurStyle.INNER),
+                ),
+                border=(None, ft.border.all(1, ft.colors.with_opacity(0.05, "white"))),
             )
         else:
-            return ft.Container(
-                content=content,
-                bgcolor=bg_color,
-                border_radius=20,
-                padding=20,
-                shadow=ft.BoxShadow(spread_radius=1, blur_radius=20, color=shadow_dark, offset=ft.Offset(10, 10)),
+            container = ft.Container(content=content, border_radius=20, padding=20)
+            return self._themed(
+                container,
+                bgcolor=BG_COLORS,
+                shadow=(
+                    ft.BoxShadow(spread_radius=1, blur_radius=20, color=ft.colors.with_opacity(0.2, "#a3b1c6"), offset=ft.Offset(10, 10)),
+                    ft.BoxShadow(spread_radius=1, blur_radius=20, color=ft.colors.with_opacity(0.5, "black"), offset=ft.Offset(10, 10)),
+                ),
             )
 
+    def _header(self, title_key, on_back):
+        return ft.Row(
+            [
+                self._themed(ft.IconButton(ft.icons.ARROW_BACK, on_click=on_back), icon_color=TEXT_COLORS),
+                self._text(title_key, upper=True, colors=TEXT_COLORS, size=20, weight="bold"),
+                ft.Container(width=40)
+            ],
+            alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+        )
+
+    # --- Views ---
     def get_main_view(self):
-        is_dark = self.page.theme_mode == ft.ThemeMode.DARK
-        bg_color = NEU_BG_DARK if is_dark else NEU_BG_LIGHT
-        text_color = "white" if is_dark else "#4a5568"
-        self.page.bgcolor = bg_color
+        self.page.bgcolor = BG_COLORS[self._is_dark()]
+        return self._cached_view("/", self._build_main_view)
+
+    def _build_main_view(self):
+        # Output area: one pane normally, one pane per mode in compare mode
+        self.single_output_pane = ft.Container(
+            content=self._neu_container(ft.Column([self.output_text], scroll=ft.ScrollMode.AUTO, on_scroll_interval=100, on_scroll=self._on_output_scroll), recessed=True),
+            expand=True,
+            visible=not self.compare_switch.value
+        )
+        self.compare_output_pane = self._build_compare_panes()
+
+        history_btn = self._themed(
+            ft.IconButton(ft.icons.HISTORY, visible=self.processor.history is not None, on_click=lambda _: self.page.go("/history")),
+            icon_color=TEXT_COLORS
+        )
+        self._translated(history_btn, "tooltip", "history_title")
 
         main_layout_content = ft.Container(
             content=ft.Column(
                 [
                     ft.Row(
                         [
-                            ft.Text(self.T("app_title").upper(), size=20, weight="bold", color=text_color),
-                            ft.IconButton(ft.icons.SETTINGS, icon_color=text_color, on_click=lambda _: self.page.go("/settings"))
+                            self._text("app_title", upper=True, colors=TEXT_COLORS, size=20, weight="bold"),
+                            ft.Row([
+                                history_btn,
+                                self._themed(ft.IconButton(ft.icons.SETTINGS, on_click=lambda _: self.page.go("/settings")), icon_color=TEXT_COLORS),
+                            ], spacing=0)
                         ],
                         alignment=ft.MainAxisAlignment.SPACE_BETWEEN
                     ),
@@ -267,8 +454,11 @@ class AppViews:
                             # COL 1: INPUT
                             ft.Column(
                                 [
-                                    ft.Text(self.T("input_label"), size=12, weight="bold", color=ft.colors.with_opacity(0.5, text_color)),
-                                    ft.Container(content=self._neu_container(self.prompt_field, is_dark, recessed=True), expand=True)
+                                    ft.Row([
+                                        self._text("input_label", colors=MUTED_TEXT_COLORS, size=12, weight="bold"),
+                                        self.token_count_text
+                                    ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
+                                    ft.Container(content=self._neu_container(self.prompt_field, recessed=True), expand=True)
                                 ],
                                 expand=4, spacing=10
                             ),
@@ -278,22 +468,26 @@ class AppViews:
                                     ft.Container(expand=True), 
                                     
                                     # Mode Selector
-                                    ft.Text(self.T("select_mode"), size=12, weight="bold", color=ACCENT_CYAN, text_align="center"),
+                                    self._text("select_mode", size=12, weight="bold", color=ACCENT_CYAN, text_align="center"),
                                     self.mode_dropdown,
                                     
                                     # File Selector (Conditional)
                                     self.file_dropdown,
                                     
+                                    self.compare_switch,
+                                    self.chunk_switch,
+                                    
                                     ft.Container(height=20),
                                     
                                     # Slider
-                                    ft.Text(self.T("temperature"), size=12, weight="bold", color=ACCENT_CYAN, text_align="center"),
+                                    self._text("temperature", size=12, weight="bold", color=ACCENT_CYAN, text_align="center"),
                                     self.temp_slider,
                                     
                                     ft.Container(height=40),
                                     
                                     # Run Button
                                     self.run_btn,
+                                    self.stop_btn,
                                     
                                     ft.Container(expand=True), 
                                 ],
@@ -306,11 +500,13 @@ class AppViews:
                             ft.Column(
                                 [
                                     ft.Row([
-                                        ft.Text(self.T("output_label"), size=12, weight="bold", color=ft.colors.with_opacity(0.5, text_color)),
+                                        self._text("output_label", colors=MUTED_TEXT_COLORS, size=12, weight="bold"),
                                         self.copy_btn
                                     ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN),
                                     
-                                    ft.Container(content=self._neu_container(ft.Column([self.output_text], scroll=ft.ScrollMode.AUTO), is_dark, recessed=True), expand=True)
+                                    self.single_output_pane,
+                                    self.compare_output_pane,
+                                    self.stats_text,
                                 ],
                                 expand=4, spacing=10
                             ),
@@ -321,43 +517,67 @@ class AppViews:
             ),
             padding=40,
             expand=True,
-            bgcolor=bg_color
         )
-        return ft.View("/", [main_layout_content], padding=0, bgcolor=bg_color)
+        self._themed(main_layout_content, bgcolor=BG_COLORS)
+        return ft.View("/", [main_layout_content], padding=0)
+
+    def _build_compare_panes(self):
+        panes = []
+        for mode in BUILTIN_MODES:
+            panes.append(
+                ft.Container(
+                    content=self._neu_container(
+                        ft.Column(
+                            [
+                                self._text(f"mode_{mode}", upper=True, size=11, weight="bold", color=ACCENT_CYAN),
+                                self.compare_outputs[mode],
+                            ],
+                            scroll=ft.ScrollMode.AUTO,
+                            spacing=5
+                        ),
+                        recessed=True
+                    ),
+                    expand=True
+                )
+            )
+        return ft.Column(panes, expand=True, spacing=10, visible=self.compare_switch.value)
 
     def get_settings_view(self):
-        is_dark = self.page.theme_mode == ft.ThemeMode.DARK
-        bg_color = NEU_BG_DARK if is_dark else NEU_BG_LIGHT
-        text_color = "white" if is_dark else "#4a5568"
-        
+        return self._cached_view("/settings", self._build_settings_view)
+
+    def _build_settings_view(self):
+        save_btn = ft.ElevatedButton(
+            on_click=self._save_and_go_back,
+            style=ft.ButtonStyle(
+                color="white",
+                bgcolor=ACCENT_CYAN,
+                shape=ft.RoundedRectangleBorder(radius=10),
+                padding=20
+            )
+        )
+        self._translated(save_btn, "text", "save_return", upper=True)
+
         return ft.View(
             "/settings",
             [
-                ft.Container(
+                self._themed(ft.Container(
                     content=ft.Column(
                         [
                             # Header
-                            ft.Row(
-                                [
-                                    ft.IconButton(ft.icons.ARROW_BACK, icon_color=text_color, on_click=self._save_and_go_back), 
-                                    ft.Text(self.T("settings_title").upper(), size=20, weight="bold", color=text_color), 
-                                    ft.Container(width=40)
-                                ], 
-                                alignment=ft.MainAxisAlignment.SPACE_BETWEEN
-                            ),
+                            self._header("settings_title", self._save_and_go_back),
                             ft.Divider(color=ft.colors.TRANSPARENT, height=20),
                             
                             # Settings Content Wrapped in Neu Container
                             self._neu_container(
                                 ft.Column([
-                                    ft.Text(self.T("api_config").upper(), weight="bold", color=ACCENT_CYAN, size=14), 
+                                    self._text("api_config", upper=True, weight="bold", color=ACCENT_CYAN, size=14), 
                                     self.api_url_field, 
                                     self.api_key_field,
                                     self.model_field,
                                     
-                                    ft.Divider(height=30, color=ft.colors.with_opacity(0.1, text_color)),
+                                    self._themed(ft.Divider(height=30), color=DIVIDER_COLORS),
                                     
-                                    ft.Text(self.T("general_settings").upper(), weight="bold", color=ACCENT_CYAN, size=14), 
+                                    self._text("general_settings", upper=True, weight="bold", color=ACCENT_CYAN, size=14), 
                                     self.language_dropdown, 
                                     self.resp_lang_dropdown,
                                     self.fmt_dropdown,
@@ -365,18 +585,8 @@ class AppViews:
                                     
                                     ft.Container(height=30),
                                     
-                                    ft.ElevatedButton(
-                                        self.T("save_return").upper(), 
-                                        on_click=self._save_and_go_back,
-                                        style=ft.ButtonStyle(
-                                            color="white",
-                                            bgcolor=ACCENT_CYAN,
-                                            shape=ft.RoundedRectangleBorder(radius=10),
-                                            padding=20
-                                        )
-                                    )
-                                ], spacing=20), 
-                                is_dark=is_dark # Pass is_dark to neu_container
+                                    save_btn
+                                ], spacing=20)
                             )
                         ], 
                         alignment=ft.MainAxisAlignment.START,
@@ -386,13 +596,123 @@ class AppViews:
                     ), 
                     padding=40, 
                     expand=True, 
-                    bgcolor=bg_color
-                )
+                ), bgcolor=BG_COLORS)
             ],
             padding=0, 
-            bgcolor=bg_color
         )
 
+    def get_history_view(self):
+        # Always reopen on the newest entries; the search text is kept
+        self.page.run_task(self._reload_history)
+        return self._cached_view("/history", self._build_history_view)
+
+    def _build_history_view(self):
+        return ft.View(
+            "/history",
+            [
+                self._themed(ft.Container(
+                    content=ft.Column(
+                        [
+                            self._header("history_title", lambda _: self.page.go("/")),
+                            ft.Divider(color=ft.colors.TRANSPARENT, height=20),
+                            self.history_search,
+                            ft.Container(
+                                content=self._neu_container(self.history_list, recessed=True),
+                                expand=True
+                            ),
+                        ],
+                        expand=True,
+                        spacing=20,
+                    ),
+                    padding=40,
+                    expand=True,
+                ), bgcolor=BG_COLORS)
+            ],
+            padding=0,
+        )
+
+    def _history_tile(self, entry, text_color):
+        original = " ".join(entry["original"].split())
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created"]))
+        details = [stamp, entry["mode"] or "", entry["model"] or ""]
+        if entry["latency_ms"] is not None:
+            details.append(f"{entry['latency_ms'] / 1000:.1f}s")
+        if entry["completion_tokens"]:
+            details.append(f"{(entry['prompt_tokens'] or 0) + entry['completion_tokens']:,} {self.T('tokens')}")
+        return ft.Container(
+            content=ft.Column([
+                ft.Text(original, size=13, color=text_color, max_lines=2, overflow=ft.TextOverflow.ELLIPSIS),
+                ft.Text(" · ".join(d for d in details if d), size=11, color=ft.colors.with_opacity(0.5, ACCENT_CYAN)),
+            ], spacing=4),
+            padding=12,
+            border_radius=10,
+            ink=True,
+            on_click=lambda _, entry_id=entry["id"]: self.page.run_task(self._open_history_entry, entry_id),
+        )
+
+    async def _reload_history(self):
+        self._history_generation += 1
+        self._history_last_id = None
+        self._history_exhausted = False
+        # A page still loading for the old list no longer blocks this one
+        self._history_loading = False
+        self.history_list.controls.clear()
+        await self._load_history_page()
+
+    async def _load_history_page(self):
+        store = self.processor.history
+        if store is None or self._history_loading or self._history_exhausted:
+            return
+        self._history_loading = True
+        generation = self._history_generation
+        try:
+            page_size = self.config_manager.get_history_page_size()
+            rows = await store.apage(self.history_search.value or "", self._history_last_id, page_size)
+            if generation != self._history_generation:
+                return  # The list was reloaded (new search or reopened) meanwhile
+            text_color = TEXT_COLORS[self._is_dark()]
+            self.history_list.controls.extend(self._history_tile(row, text_color) for row in rows)
+            if rows:
+                self._history_last_id = rows[-1]["id"]
+            self._history_exhausted = len(rows) < page_size
+            if not self.history_list.controls:
+                self.history_list.controls.append(
+                    ft.Text(self.T("history_empty"), size=13, color=MUTED_TEXT_COLORS[self._is_dark()]))
+        finally:
+            if generation == self._history_generation:
+                self._history_loading = False
+        if self.history_list.page:
+            self.history_list.update()
+
+    async def _on_history_search(self, e):
+        self._history_search_token += 1
+        token = self._history_search_token
+        # Debounce typing; only the latest query runs
+        await asyncio.sleep(0.15)
+        if token == self._history_search_token:
+            await self._reload_history()
+
+    def _on_output_scroll(self, e):
+        if self.output_window is not None:
+            self.output_window.on_scroll(e)
+
+    def _on_history_scroll(self, e):
+        if e.pixels >= e.max_scroll_extent - 200:
+            self.page.run_task(self._load_history_page)
+
+    async def _open_history_entry(self, entry_id):
+        entry = await self.processor.history.aget(entry_id)
+        if entry is None:
+            return
+        self.prompt_field.value = entry["original"]
+        self.output_window = None
+        self.output_text.value = entry["processed"]
+        if entry["mode"] in BUILTIN_MODES:
+            self.mode_dropdown.value = entry["mode"]
+        if entry["temperature"] is not None:
+            self.temp_slider.value = entry["temperature"]
+        self.page.go("/")
+
     # --- Handlers ---
     def _on_btn_hover(self, e):
         e.control.scale = 1.05 if e.data == "true" else 1.0
@@ -401,35 +721,103 @@ class AppViews:
     async def _on_run_click_wrapper(self, e):
         self.run_btn.scale = 0.95; self.run_btn.update()
         await self._on_run_click(e)
-        self.run_btn.scale = 1.0; self.run_btn.update()
+        self.run_btn.scale = 1.0
+        if self.run_btn.page:  # Navigation may have removed the main view meanwhile
+            self.run_btn.update()
 
     def _on_language_change(self, e):
         if e.control.value != self.lang: 
             self.lang = e.control.value
             self._refresh_ui_text()
-        # Force reload to update UI text in all views
-        self.page.go(self.page.route)
 
     def _on_theme_change(self, e):
         new_mode = "dark" if e.control.value else "light"
         self.page.theme_mode = ft.ThemeMode.DARK if new_mode == "dark" else ft.ThemeMode.LIGHT
-        # Force reload to apply theme colors to _neu_container
-        self.page.go(self.page.route)
+        self.apply_theme()
 
     def _save_and_go_back(self, e):
-        self.config_manager.set_api_url(self.api_url_field.value)
-        self.config_manager.set_api_key(self.api_key_field.value)
-        self.config_manager.set_model(self.model_field.value)
-        self.config_manager.set_language(self.lang) 
-        
-        # New Settings
-        self.config_manager.set_response_language(self.resp_lang_dropdown.value)
-        self.config_manager.set_output_format(self.fmt_dropdown.value)
-        
         new_mode = "dark" if self.theme_switch.value else "light"
-        self.config_manager.set_theme_mode(new_mode) 
+        # One atomic write and one change notification for the whole form
+        with self.config_manager.batch():
+            self.config_manager.set_api_url(self.api_url_field.value)
+            self.config_manager.set_api_key(self.api_key_field.value)
+            self.config_manager.set_model(self.model_field.value)
+            self.config_manager.set_language(self.lang) 
+            
+            # New Settings
+            self.config_manager.set_response_language(self.resp_lang_dropdown.value)
+            self.config_manager.set_output_format(self.fmt_dropdown.value)
+            self.config_manager.set_theme_mode(new_mode) 
         self.page.go("/")
 
+    def _on_compare_change(self, e):
+        comparing = self.compare_switch.value
+        self.mode_dropdown.disabled = comparing
+        self.chunk_switch.disabled = comparing
+        self.file_dropdown.visible = not comparing and self.mode_dropdown.value == "custom"
+        self.single_output_pane.visible = not comparing
+        self.compare_output_pane.visible = comparing
+        self._update_token_count()
+        self.page.update()
+
+    def _update_token_count(self):
+        self._token_count_token += 1
+        self.page.run_task(self._recount_tokens, self._token_count_token)
+
+    async def _recount_tokens(self, token):
+        # Debounce typing; the count runs off the keystroke path, once typing pauses
+        await asyncio.sleep(0.15)
+        if token != self._token_count_token:
+            return
+        prompt = self.prompt_field.value or ""
+        mode = BUILTIN_MODES[0] if self.compare_switch.value else self.mode_dropdown.value
+        custom_path = self.file_dropdown.value if mode == "custom" else None
+        if not prompt or (mode == "custom" and not custom_path):
+            self.token_count_text.value = ""
+        else:
+            tokens = await self.processor.count_prompt_tokens(
+                mode, prompt, self.config_manager.get_response_language(),
+                self.config_manager.get_output_format(), custom_path
+            )
+            if token != self._token_count_token:
+                return
+            limit = self.processor.budget_limit()
+            if limit:
+                self.token_count_text.value = f"≈ {tokens:,} / {limit[0]:,} {self.T('tokens')}"
+                over = tokens > limit[0]
+            else:
+                self.token_count_text.value = f"≈ {tokens:,} {self.T('tokens')}"
+                over = False
+            self.token_count_text.color = ft.colors.RED_400 if over else ft.colors.with_opacity(0.5, ACCENT_CYAN)
+        if self.token_count_text.page:
+            self.token_count_text.update()
+
+    def _update_stats(self):
+        self.stats_text.visible = METRICS.enabled
+        if not METRICS.enabled:
+            return
+        histograms = METRICS.snapshot()["histograms"]
+
+        def p50(name, scale=1.0, fmt="{:.0f}"):
+            value = histograms.get(name, {}).get("p50")
+            return fmt.format(value * scale) if value is not None else "–"
+
+        self.stats_text.value = " · ".join([
+            f"TTFT {p50('llm_ttft_seconds', 1000)} ms",
+            f"{p50('llm_tokens_per_second')} tok/s",
+            f"gap {p50('llm_inter_chunk_seconds', 1000)} ms",
+            f"UI {p50('ui_update_seconds', 1000, '{:.1f}')} ms",
+            f"total {p50('generation_seconds', 1, '{:.1f}')} s",
+        ])
+
+    async def _refresh_stats_live(self):
+        # Runs alongside a generation; only the strip itself is sent
+        while True:
+            await asyncio.sleep(STATS_REFRESH_INTERVAL)
+            self._update_stats()
+            if self.stats_text.page is not None:
+                self.stats_text.update()
+
     def _on_mode_change(self, e):
         # Handle Custom Mode Logic
         if self.mode_dropdown.value == "custom":
@@ -437,11 +825,12 @@ class AppViews:
             self.file_dropdown.visible = True
         else:
             self.file_dropdown.visible = False
+        self._update_token_count()
         self.page.update()
 
     def _load_custom_templates(self):
         templates = self.processor.loader.list_custom_templates()
-        options = [ft.dropdown.Option(t["path"], t["name"]) for t in templates]
+        options = [ft.dropdown.Option(t["path"], t["title"] or t["name"]) for t in templates]
         self.file_dropdown.options = options
         if options:
             self.file_dropdown.value = options[0].key
@@ -450,7 +839,14 @@ class AppViews:
             self.file_dropdown.hint_text = "No .md files found"
 
     def _on_copy_click(self, e):
-        self.page.set_clipboard(self.output_text.value)
+        if self.compare_switch.value:
+            self.page.set_clipboard("\n\n".join(
+                f"## {self.T(f'mode_{mode}')}\n\n{pane.value}" for mode, pane in self.compare_outputs.items()
+            ))
+        else:
+            # A spooled output only shows a window; copy the whole file
+            window = self.output_window
+            self.page.set_clipboard(window.sink.read_all() if window else self.output_text.value)
         self.copy_btn.icon = ft.icons.CHECK
         self.copy_btn.tooltip = self.T("copied")
         self.page.update()
@@ -464,20 +860,63 @@ class AppViews:
             self.page.update()
         threading.Thread(target=reset_icon, daemon=True).start()
 
+    def cancel_generation(self) -> bool:
+        """
+        Stops the running generation, if any. Cancelling the task closes the
+        upstream HTTP stream right away. Returns True if something was stopped.
+        """
+        task = self._generation
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
     async def _on_run_click(self, e):
+        # A new run supersedes whatever is still streaming
+        self.cancel_generation()
+        self.output_window = None
+
         self.run_btn.opacity = 0.5
-        self.output_text.value = self.T("processing")
-        self.page.update()
-        
-        custom_path = self.file_dropdown.value if self.mode_dropdown.value == "custom" else None
-        
-        await self.on_run_callback(
-            self.prompt_field.value, 
-            self.mode_dropdown.value, 
-            self.temp_slider.value, 
-            self,
-            custom_path=custom_path # Pass custom path
-        )
-        
-        self.run_btn.opacity = 1.0
-        self.page.update()
\ No newline at end of file
+        self.stop_btn.visible = True
+        if self.compare_switch.value and self.on_run_all_callback:
+            for pane in self.compare_outputs.values():
+                pane.value = self.T("processing")
+            self.page.update()
+            run = self.on_run_all_callback(
+                self.prompt_field.value,
+                BUILTIN_MODES,
+                self.temp_slider.value,
+                self
+            )
+        else:
+            self.output_text.value = self.T("processing")
+            self.page.update()
+            
+            custom_path = self.file_dropdown.value if self.mode_dropdown.value == "custom" else None
+            
+            run = self.on_run_callback(
+                self.prompt_field.value, 
+                self.mode_dropdown.value, 
+                self.temp_slider.value, 
+                self,
+                custom_path=custom_path # Pass custom path
+            )
+
+        task = self._generation = asyncio.ensure_future(run)
+        ticker = asyncio.ensure_future(self._refresh_stats_live()) if METRICS.enabled else None
+        # wait() rather than await: a stopped generation is not an error for this handler
+        try:
+            await asyncio.wait([task])
+        finally:
+            if ticker:
+                ticker.cancel()
+
+        # A superseding run owns the controls now
+        if self._generation is task:
+            self._generation = None
+            self.run_btn.opacity = 1.0
+            self.stop_btn.visible = False
+            self._update_stats()
+            self.page.update()
+        if not task.cancelled():
+            task.result()
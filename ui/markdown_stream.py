@@ -0,0 +1,167 @@
+import re
+
+import flet as ft
+
+FENCE_OPEN = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+LIST_ITEM = re.compile(r"^ {0,3}([-*+]|\d{1,9}[.)])(\s|$)")
+# Link reference or footnote definition ("[id]: url", "[^1]: note")
+DEFINITION = re.compile(r"^ {0,3}\[[^\]\n]+\]:", re.M)
+
+
+def split_markdown_blocks(text: str):
+    """
+    Splits Markdown into finished top-level blocks plus the trailing open one.
+    A block is finished once a blank line is followed by the start of another
+    block (list items and indented continuations keep a list open), or when
+    its fenced code block closes. Only complete lines are considered, so the
+    open block is whatever may still change as more text streams in.
+    Returns (blocks, tail); "".join(blocks) + tail == text.
+    """
+    blocks = []
+    start = 0
+    fence = None
+    in_list = False
+    has_content = False
+    pending_blank = False
+    pos = 0
+    while True:
+        end = text.find("\n", pos)
+        if end == -1:
+            break
+        line_start, pos = pos, end + 1
+        line = text[line_start:end]
+
+        if fence:
+            if re.match(rf"^ {{0,3}}{re.escape(fence[0])}{{{len(fence)},}}\s*$", line):
+                fence = None
+                blocks.append(text[start:pos])
+                start, has_content, in_list = pos, False, False
+            continue
+
+        if not line.strip():
+            if has_content:
+                pending_blank = True
+            continue
+
+        if pending_blank:
+            pending_blank = False
+            continues_list = in_list and (LIST_ITEM.match(line) or line[:1] in (" ", "\t"))
+            if not continues_list:
+                blocks.append(text[start:line_start])
+                start, has_content, in_list = line_start, False, False
+
+        match = FENCE_OPEN.match(line)
+        if match:
+            # A fence can interrupt a paragraph; what came before is finished
+            if has_content and not in_list:
+                blocks.append(text[start:line_start])
+                start, has_content = line_start, False
+            fence = match.group(1)
+        if not has_content:
+            in_list = bool(LIST_ITEM.match(line))
+        has_content = True
+
+    return blocks, text[start:]
+
+
+class _BlockGroup(ft.Column):
+    # Isolated: updating the stream does not walk back into finished blocks
+    def is_isolated(self):
+        return True
+
+
+class MarkdownStream(ft.Column):
+    """
+    Drop-in for ft.Markdown output that grows by appending. Finished blocks
+    become their own Markdown controls and are never touched again; only the
+    trailing open block is re-rendered as text streams in. Blocks are kept in
+    isolated groups of `group_size`, so an update diffs at most one group plus
+    the list of groups rather than every block so far.
+
+    append() costs O(open block + new text) whatever the length so far.
+    Assigning `value` keeps the finished blocks the new text still starts
+    with and re-splits the rest, which suits bounded windows; streams should
+    append.
+
+    Reference links and footnotes only resolve within one Markdown control,
+    so once a definition shows up the whole text falls back to a single
+    control for the rest of the stream.
+    """
+    def __init__(self, value: str = "", spacing: float = 10, group_size: int = 32, **markdown_options):
+        self._options = markdown_options
+        self._group_size = group_size
+        self._blocks = []
+        self._single = False
+        self._groups_changed = False
+        self._dirty_groups = []
+        self._tail = ft.Markdown("", **markdown_options)
+        super().__init__(controls=[self._tail], spacing=spacing)
+        self.value = value
+
+    @property
+    def value(self) -> str:
+        return "".join(self._blocks) + (self._tail.value or "")
+
+    @value.setter
+    def value(self, text: str):
+        text = text or ""
+        pos = 0
+        kept = 0
+        for block in self._blocks:
+            if not text.startswith(block, pos):
+                break
+            pos += len(block)
+            kept += 1
+        if kept < len(self._blocks) or self._single:
+            self._reset()
+            pos = 0
+        self._tail.value = ""
+        self.append(text[pos:])
+
+    def append(self, text: str):
+        if not text:
+            return
+        text = (self._tail.value or "") + text
+        if self._single:
+            self._tail.value = text
+            return
+        if DEFINITION.search(text):
+            text = "".join(self._blocks) + text
+            self._reset()
+            self._single = True
+            self._tail.value = text
+            return
+        blocks, tail = split_markdown_blocks(text)
+        for block in blocks:
+            self._append_block(block)
+        self._tail.value = tail
+
+    def _reset(self):
+        self.controls = [self._tail]
+        self._blocks = []
+        self._single = False
+        self._groups_changed = True
+        self._dirty_groups = []
+
+    def _append_block(self, block: str):
+        group = self.controls[-2] if len(self.controls) > 1 else None
+        if group is None or len(group.controls) >= self._group_size:
+            group = _BlockGroup(spacing=self.spacing)
+            self.controls.insert(len(self.controls) - 1, group)
+            self._groups_changed = True
+        group.controls.append(ft.Markdown(block, **self._options))
+        if group not in self._dirty_groups:
+            self._dirty_groups.append(group)
+        self._blocks.append(block)
+
+    def update(self):
+        # Groups not yet on the page go out whole with the column update below
+        for group in self._dirty_groups:
+            if group.page is not None:
+                group.update()
+        self._dirty_groups = []
+        if self._groups_changed:
+            self._groups_changed = False
+            super().update()
+        else:
+            self._tail.update()
@@ -0,0 +1,173 @@
+import asyncio
+import time
+
+from core.llm_client import StreamError
+from core.metrics import METRICS
+
+
+class StreamRenderer:
+    """
+    Buffers streamed chunks and pushes them to a text/markdown control at a
+    capped rate instead of once per token. Chunks are kept in a list and only
+    joined when a frame is actually sent, and only the target control is
+    updated rather than the whole page. A control with append() (such as
+    MarkdownStream) gets only the text since the last frame, after the first
+    frame replaced its previous contents, so a frame costs the same however
+    long the output is; other controls get the whole text each frame.
+    """
+    # Subclasses whose frames are not plain appends re-assign the whole text
+    incremental = True
+
+    def __init__(self, control, max_fps: float = 30):
+        self.control = control
+        self.interval = 1.0 / max_fps if max_fps and max_fps > 0 else 0.0
+        self._chunks = []
+        self._appending = False
+        self._dirty = False
+        self._last_flush = 0.0
+        self._timer = None
+
+    @property
+    def text(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._dirty = True
+        elapsed = time.monotonic() - self._last_flush
+        if elapsed >= self.interval:
+            self.flush()
+        elif self._timer is None:
+            # Make sure the tail shows up even if the stream pauses mid-frame
+            self._timer = asyncio.get_running_loop().call_later(self.interval - elapsed, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        if self.incremental and hasattr(self.control, "append"):
+            delta = "".join(self._chunks)
+            self._chunks = []
+            if self._appending:
+                self.control.append(delta)
+            else:
+                self.control.value = delta
+                self._appending = True
+        else:
+            self.control.value = self.text
+        # A control removed by navigation keeps its value for when the view is rebuilt
+        if self.control.page is not None:
+            with METRICS.span("ui_update_seconds"):
+                self.control.update()
+        self._last_flush = time.monotonic()
+
+    def close(self, suffix: str = ""):
+        """
+        Final flush. Always call this, including on error paths.
+        """
+        if suffix:
+            self._chunks.append(suffix)
+            self._dirty = True
+        self.flush()
+
+
+class SectionedRenderer(StreamRenderer):
+    """
+    StreamRenderer for output assembled from several concurrent streams, such
+    as the chunks of a map-reduce run. Each section buffers its own chunks and
+    frames show a header line followed by the sections in order.
+    """
+    incremental = False
+
+    def __init__(self, control, sections: int, max_fps: float = 30, separator: str = "\n\n"):
+        super().__init__(control, max_fps)
+        self.sections = [[] for _ in range(sections)]
+        self.header = ""
+        self.separator = separator
+
+    @property
+    def text(self) -> str:
+        body = self.separator.join("".join(parts) for parts in self.sections if parts)
+        if self._chunks:
+            # Trailing suffix passed to close()
+            body += "".join(self._chunks)
+        return f"{self.header}\n\n{body}" if self.header else body
+
+    def feed_section(self, index: int, chunk: str):
+        if not chunk:
+            return
+        self.sections[index].append(chunk)
+        self._mark_dirty()
+
+    def set_header(self, header: str):
+        self.header = header
+        self._mark_dirty()
+
+
+class TailRenderer(StreamRenderer):
+    """
+    StreamRenderer for output spooled to an OutputSink. The control shows a
+    window of at most `max_pages` pages (the tail while following the stream),
+    so neither this renderer nor the control grows with the output. Earlier
+    pages are read back from the sink when the user scrolls up; scrolling back
+    down returns to following the tail. Only non-content text (errors and the
+    closing suffix) is kept here; content lives in the sink.
+    """
+    incremental = False
+
+    def __init__(self, control, sink, max_fps: float = 30, max_pages: int = 3):
+        super().__init__(control, max_fps)
+        self.sink = sink
+        self.max_pages = max(1, max_pages)
+        self.first_page = 0
+        self.following = True
+
+    @property
+    def text(self) -> str:
+        count = self.sink.page_count
+        if self.following:
+            self.first_page = max(0, count - self.max_pages)
+        last = min(count, self.first_page + self.max_pages)
+        body = "".join(self.sink.page_text(i) for i in range(self.first_page, last))
+        if self.sink.page_in_fence(self.first_page):
+            # The page was cut inside a long code block; reopen it so the rest still renders as code
+            body = "```\n" + body
+        if self.first_page > 0:
+            body = f"*… {self.first_page} earlier part(s) in {self.sink.path}; scroll up to load*\n\n{body}"
+        if last == count and self._chunks:
+            body += "".join(self._chunks)
+        return body
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        # Content was already written to the sink by the processor
+        if isinstance(chunk, StreamError):
+            self._chunks.append(chunk)
+        if self.following:
+            self._mark_dirty()
+
+    def on_scroll(self, e):
+        """
+        Scroll handler for the control's scrollable parent.
+        """
+        if e.pixels <= e.min_scroll_extent + 50 and self.first_page > 0:
+            self.following = False
+            self.first_page -= 1
+        elif e.pixels >= e.max_scroll_extent - 50 and not self.following:
+            self.first_page += 1
+            self.following = self.first_page + self.max_pages >= self.sink.page_count
+        else:
+            return
+        self._dirty = True
+        self.flush()